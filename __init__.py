@@ -1,11 +1,15 @@
 import os
 from flask import Flask
 from dotenv import load_dotenv
-from extensions import db
-from config import config
 
+# Before config: its settings are read from the environment at import
 load_dotenv()
 
+from extensions import db  # noqa: E402
+from config import config  # noqa: E402
+from sqlite_profile import apply_sqlite_profile  # noqa: E402
+from jinja_cache import configure_bytecode_cache  # noqa: E402
+
 
 def create_app(config_name=None):
     if config_name is None:
@@ -21,9 +25,18 @@ def create_app(config_name=None):
     database_url = app.config.get('SQLALCHEMY_DATABASE_URI', '')
     if database_url.startswith('postgres://'):
         app.config['SQLALCHEMY_DATABASE_URI'] = database_url.replace('postgres://', 'postgresql://', 1)
+    app.config['SQLALCHEMY_BINDS'] = {
+        key: url.replace('postgres://', 'postgresql://', 1) if url.startswith('postgres://') else url
+        for key, url in app.config.get('SQLALCHEMY_BINDS', {}).items()
+    }
 
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            apply_sqlite_profile(engine, app.config.get('SQLITE_PRAGMAS'))
+
+    configure_bytecode_cache(app)
 
     # Register Jinja2 filters
     from utils import utc_to_ist
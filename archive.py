@@ -0,0 +1,111 @@
+"""Retention for finished tokens
+
+archive_finished_tokens() moves Completed/Expired/No Show tokens older than
+TOKEN_ARCHIVE_AFTER_DAYS from `tokens` into `tokens_archive` in batches, so
+the live table only holds recent history. Run it from a scheduler:
+
+    flask admin archive-tokens
+
+Readers that need full history use token_history_union() or
+history_page(), which read both tables.
+"""
+from datetime import timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import ArchivedToken, Token
+from utils import get_ist_now, keyset_page
+
+FINISHED_STATUSES = ['Completed', 'Expired', 'No Show']
+
+ARCHIVED_COLUMNS = [column.key for column in Token.__table__.columns]
+
+
+def archive_finished_tokens(older_than_days=None, batch_size=None, dry_run=False):
+    """Move finished tokens created before the horizon into tokens_archive
+
+    Each batch is copied and deleted in its own transaction, so the job can
+    be interrupted and rerun safely and never holds long locks on tokens.
+    Returns the number of tokens archived (or that would be, on dry_run).
+    """
+    config = current_app.config
+    if older_than_days is None:
+        older_than_days = config.get('TOKEN_ARCHIVE_AFTER_DAYS', 90)
+    if batch_size is None:
+        batch_size = config.get('TOKEN_ARCHIVE_BATCH_SIZE', 500)
+    # Today's tokens feed token numbering, so never archive them
+    cutoff = get_ist_now() - timedelta(days=max(older_than_days, 1))
+
+    eligible = db.select(Token.id).where(
+        Token.status.in_(FINISHED_STATUSES),
+        Token.created_time < cutoff
+    )
+    if dry_run:
+        return db.session.scalar(db.select(db.func.count()).select_from(eligible.subquery()))
+
+    archived = 0
+    while True:
+        ids = db.session.scalars(eligible.order_by(Token.id).limit(batch_size)).all()
+        if not ids:
+            break
+        try:
+            columns = [getattr(Token, key) for key in ARCHIVED_COLUMNS]
+            db.session.execute(
+                db.insert(ArchivedToken).from_select(
+                    ARCHIVED_COLUMNS + ['archived_time'],
+                    db.select(*columns, db.literal(get_ist_now(), db.DateTime)).where(Token.id.in_(ids))
+                )
+            )
+            db.session.execute(
+                db.delete(Token).where(Token.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archived += len(ids)
+        print(f"📦 Archived {archived} tokens so far (cutoff {cutoff:%Y-%m-%d})")
+    return archived
+
+
+def token_history_union(*columns, where=None):
+    """UNION ALL of the given column names from tokens and tokens_archive, as a subquery
+
+    `where` is a callable taking the model (Token or ArchivedToken) and
+    returning filter clauses, so predicates apply inside each branch.
+    """
+    selects = []
+    for model in (Token, ArchivedToken):
+        stmt = db.select(*[getattr(model, name) for name in columns])
+        if where is not None:
+            stmt = stmt.where(*where(model))
+        selects.append(stmt)
+    return db.union_all(*selects).subquery('all_tokens')
+
+
+def history_page(where, cursor=None, per_page=50):
+    """keyset_page() across live and archived tokens, newest first
+
+    Ids are shared between the tables, so each is paged with the same cursor
+    and the two pages are merged; rows are Token or ArchivedToken objects.
+    """
+    rows = []
+    has_more = False
+    for model in (Token, ArchivedToken):
+        page, next_cursor = keyset_page(
+            model.query.filter(*where(model)), model.created_time, model.id,
+            cursor=cursor, per_page=per_page
+        )
+        rows.extend(page)
+        has_more = has_more or next_cursor is not None
+
+    rows.sort(key=lambda row: (row.created_time, row.id), reverse=True)
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        has_more = True
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = f"{last.created_time.strftime('%Y%m%d%H%M%S%f')}-{last.id}"
+    return rows, next_cursor
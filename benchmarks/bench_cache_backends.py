@@ -0,0 +1,140 @@
+"""Benchmark: cache backends side by side, after checking they behave the same.
+
+Runs every available backend through the same parity checks, then times
+--ops namespaced reads and writes on each:
+
+  local   - LocalCache
+  sqlite  - SQLiteCache on a scratch file
+  redis   - RedisCache on --redis-url, or on an in-process Redis stand-in
+            when the optional `fakeredis` package is installed (skipped
+            otherwise)
+
+The checks cover what callers rely on. Values such as row tuples and dicts
+come back equal after pickling. Missing and deleted keys read as None,
+and TTLs expire. incr counts from 0, and invalidate() hides a namespace's
+old keys without touching other namespaces and notifies subscribers. Any
+mismatch is printed and the script exits non-zero.
+
+Usage:
+    python benchmarks/bench_cache_backends.py [--ops 5000] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LocalCache, RedisCache, SQLiteCache  # noqa: E402
+
+VALUES = [
+    42,
+    'Nagpur',
+    (1, 'Center 1', 'Bank', 'Nagpur', 10, 3, 0),
+    {'version': 7, 'boundaries': [datetime(2026, 1, 1, 9, 30)]},
+    [(1, 0.5), (2, 1.25)],
+]
+
+
+def check(cache):
+    """Parity problems found on this backend, as strings"""
+    problems = []
+
+    def expect(label, actual, expected):
+        if actual != expected:
+            problems.append(f"{label}: got {actual!r}, expected {expected!r}")
+
+    for i, value in enumerate(VALUES):
+        cache.ns_set('parity', i, value)
+        expect(f"round trip {type(value).__name__}", cache.ns_get('parity', i), value)
+    expect("missing key", cache.ns_get('parity', 'missing'), None)
+    cache.ns_delete('parity', 0)
+    expect("deleted key", cache.ns_get('parity', 0), None)
+
+    cache.ns_set('parity', 'short', 'x', ttl=0.2)
+    expect("before ttl", cache.ns_get('parity', 'short'), 'x')
+    time.sleep(0.3)
+    expect("after ttl", cache.ns_get('parity', 'short'), None)
+
+    expect("first incr", cache.incr('parity:counter'), 1)
+    expect("second incr", cache.incr('parity:counter'), 2)
+
+    notified = []
+    cache.subscribe(notified.append)
+    cache.ns_set('other', 'kept', 'y')
+    cache.invalidate('parity')
+    expect("invalidated key", cache.ns_get('parity', 1), None)
+    expect("other namespace", cache.ns_get('other', 'kept'), 'y')
+    cache.ns_set('parity', 1, 'new')
+    expect("set after invalidate", cache.ns_get('parity', 1), 'new')
+    # Redis delivers the notification from its listener thread
+    deadline = time.monotonic() + 2
+    while 'parity' not in notified and time.monotonic() < deadline:
+        time.sleep(0.01)
+    expect("subscriber notified", 'parity' in notified, True)
+    return problems
+
+
+def throughput(cache, ops):
+    """(reads/s, writes/s) for namespaced keys"""
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.ns_set('bench', i % 100, VALUES[2], ttl=60)
+    writes = ops / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.ns_get('bench', i % 100)
+    reads = ops / (time.perf_counter() - start)
+    return reads, writes
+
+
+def redis_backend(url):
+    if url:
+        cache = RedisCache(url)
+        cache._redis.flushdb()
+        return cache
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+    cache = RedisCache('redis://localhost:6379/0')
+    cache._redis = fakeredis.FakeRedis()
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--redis-url', default=None, help='A scratch Redis database; it is flushed')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'backend':>8} {'parity':>8} {'reads/s':>10} {'writes/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            redis_cache = redis_backend(args.redis_url)
+        except RuntimeError as e:
+            print(f"{'redis':>8}  skipped: {e}")
+            redis_cache = None
+        backends = [('local', LocalCache()), ('sqlite', SQLiteCache(os.path.join(tmp, 'cache.db')))]
+        if redis_cache is not None:
+            backends.append(('redis', redis_cache))
+        elif not args.redis_url:
+            print(f"{'redis':>8}  skipped: pass --redis-url or pip install fakeredis")
+
+        for name, cache in backends:
+            problems = check(cache)
+            reads, writes = throughput(cache, args.ops)
+            print(f"{name:>8} {'ok' if not problems else 'FAILED':>8} {reads:>10.0f} {writes:>10.0f}")
+            for problem in problems:
+                print(f"{'':>10}{problem}")
+            failed = failed or bool(problems)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
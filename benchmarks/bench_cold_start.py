@@ -0,0 +1,115 @@
+"""Benchmark: cold start, from a fresh interpreter to the first response.
+
+What an auto-sleeping dyno pays on its first request after waking. Each run
+starts a new `python -X importtime` process that imports run.py (create_app
+and every blueprint) and serves GET --path through the test client:
+
+  no cache     - JINJA_BYTECODE_CACHE_DIR='': templates compile on demand
+  precompiled  - a cache filled beforehand by precompile_templates(), as
+                 `flask admin precompile-templates` does at build time
+
+Reports the median of --runs for interpreter start-up, importing run.py
+(module imports and create_app()), the first response and the total, then
+the slowest imports by cumulative time. With --budget-ms, exits non-zero when the precompiled
+median total exceeds it, so CI can track a startup budget.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--path /] [--budget-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import run
+app_done = time.perf_counter()
+response = run.app.test_client().get({path!r})
+response_done = time.perf_counter()
+print(json.dumps({{'create_app': app_done - started, 'response': response_done - app_done,
+                   'status': response.status_code}}))
+"""
+
+
+def cold_start(path, env):
+    """One fresh process: (seconds by phase, importtime lines)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD.format(root=ROOT, path=path)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    total = time.perf_counter() - start
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    phases['total'] = total
+    return phases, [line for line in result.stderr.splitlines() if line.startswith('import time:')]
+
+
+def slowest_imports(lines, count):
+    """[(cumulative ms, module)] for the top three levels of the import tree, slowest first"""
+    imports = []
+    for line in lines:
+        _, cumulative_us, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative_us.strip().isdigit() and depth <= 2:
+            imports.append((int(cumulative_us) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def run(label, cache_dir, args):
+    env = {**os.environ, 'JINJA_BYTECODE_CACHE_DIR': cache_dir, 'DATABASE_URL': args.database_url}
+    samples, lines = [], []
+    for _ in range(args.runs):
+        phases, lines = cold_start(args.path, env)
+        if phases['status'] >= 500:
+            raise RuntimeError(f"GET {args.path} returned {phases['status']}")
+        samples.append(phases)
+    median = {key: statistics.median(sample[key] for sample in samples) * 1000
+              for key in ('create_app', 'response', 'total')}
+    print(f"{label:>12} {median['total'] - median['create_app'] - median['response']:>16.0f} "
+          f"{median['create_app']:>13.0f} {median['response']:>15.0f} {median['total']:>9.0f}")
+    return median, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--top', type=int, default=12, help='How many of the slowest imports to list')
+    parser.add_argument('--budget-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        cache_dir = os.path.join(tmp, 'jinja')
+        os.environ.update({'DATABASE_URL': args.database_url, 'JINJA_BYTECODE_CACHE_DIR': cache_dir})
+        from __init__ import create_app
+        from jinja_cache import precompile_templates
+
+        compiled = precompile_templates(create_app())
+
+        print(f"GET {args.path}, median of {args.runs} fresh processes, {len(compiled)} templates precompiled (ms)")
+        print(f"{'':>12} {'python start-up':>16} {'create_app':>13} {'first response':>15} {'total':>9}")
+        run('no cache', '', args)
+        median, lines = run('precompiled', cache_dir, args)
+
+    print("\nSlowest imports (cumulative ms, last precompiled run):")
+    for ms, name in slowest_imports(lines, args.top):
+        print(f"{ms:>9.1f}  {name}")
+
+    if args.budget_ms is not None and median['total'] > args.budget_ms:
+        print(f"\nOver budget: {median['total']:.0f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark: ETA assignment at payment, full time-chain rebuild vs tail lookup.
+
+Builds an in-memory SQLite queue of N confirmed tokens for one center and
+times how long it takes to derive the slot of token N+1 with:
+
+  legacy  - the old payment() logic: load every earlier Active/Serving token,
+            re-fetch the first token's user, call ORS for them again, then
+            walk the list adding avg_service_time
+  tail    - utils.calculate_booking_times(): one indexed lookup of the token
+            just ahead and its stored estimated_service_end
+
+ORS is replaced by a fixed-latency stand-in so the network cost is visible
+without an API key.
+
+Usage:
+    python benchmarks/bench_eta.py [--ors-latency-ms 0] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from __init__ import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import ServiceCenter, Token, User  # noqa: E402
+from utils import calculate_booking_times, get_ist_now  # noqa: E402
+
+QUEUE_LENGTHS = [1, 10, 50, 100, 250, 500]
+
+
+def legacy_booking_times(center, token, travel_time, travel_time_fn):
+    """Reference copy of the pre-engine payment() time-chain rebuild"""
+    previous_tokens = Token.query.filter(
+        Token.service_center_id == center.id,
+        Token.status.in_(['Active', 'Serving']),
+        Token.is_walkin == False,
+        Token.id < token.id
+    ).order_by(Token.id).all()
+    first_token = previous_tokens[0]
+    first_user = User.query.get(first_token.user_id)
+    first_travel = travel_time_fn(first_user) or 30
+    first_arrival = first_token.created_time + timedelta(minutes=10 + first_travel)
+    service_end_time = first_arrival + timedelta(minutes=center.avg_service_time)
+    for _ in previous_tokens[1:]:
+        service_end_time = service_end_time + timedelta(minutes=center.avg_service_time)
+    earliest_arrival = get_ist_now() + timedelta(minutes=10 + travel_time)
+    reach_time = max(service_end_time, earliest_arrival)
+    return reach_time - timedelta(minutes=travel_time), reach_time
+
+
+def build_queue(length):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    center = ServiceCenter(name='Bench Center', category='Medical Clinic', location='Nagpur',
+                           latitude=21.1458, longitude=79.0882, avg_service_time=15)
+    db.session.add(center)
+    db.session.flush()
+
+    now = get_ist_now()
+    service_end = now
+    for i in range(length + 1):
+        user = User(name=f'User {i}', mobile=f'9{i:09d}', email=f'u{i}@bench.local', password='x',
+                    latitude=21.10, longitude=79.08)
+        db.session.add(user)
+        db.session.flush()
+        token = Token(user_id=user.id, service_center_id=center.id, token_number=f'T{i + 1:03d}',
+                      status='Active', created_time=now)
+        if i < length:
+            token.reach_time = max(service_end, now + timedelta(minutes=40))
+            token.estimated_service_start = token.reach_time
+            token.estimated_service_end = token.reach_time + timedelta(minutes=center.avg_service_time)
+            service_end = token.estimated_service_end
+        else:
+            token.status = 'PendingPayment'
+        db.session.add(token)
+    db.session.commit()
+    return center, token
+
+
+def time_it(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expire_all()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ors-latency-ms', type=float, default=0.0,
+                        help='simulated ORS round trip for the extra legacy call')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    ors_calls = {'n': 0}
+
+    def fake_ors(_user):
+        ors_calls['n'] += 1
+        if args.ors_latency_ms:
+            time.sleep(args.ors_latency_ms / 1000)
+        return 30
+
+    app = create_app()
+    with app.app_context():
+        print(f"{'queue':>6} {'legacy ms':>10} {'tail ms':>9} {'speedup':>8} {'legacy ORS/booking':>19}")
+        for length in QUEUE_LENGTHS:
+            center, token = build_queue(length)
+            ors_calls['n'] = 0
+            legacy = time_it(lambda: legacy_booking_times(center, token, 30, fake_ors), args.repeat)
+            legacy_calls = ors_calls['n'] / args.repeat
+            tail = time_it(lambda: calculate_booking_times(center, token, 30), args.repeat)
+            print(f"{length:>6} {legacy:>10.3f} {tail:>9.3f} {legacy / tail:>7.1f}x {legacy_calls:>19.0f}")
+
+
+if __name__ == '__main__':
+    main()
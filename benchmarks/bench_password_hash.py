@@ -0,0 +1,77 @@
+"""Benchmark: password hash cost calibration for PASSWORD_HASH_METHOD.
+
+Times werkzeug's hash and verify for a ladder of scrypt and PBKDF2
+parameters on this machine and reports verify latency, the logins per
+second one CPU core can sustain, and scrypt's memory per hash. The last
+column marks the strongest setting of each family whose verify time fits
+--target-ms; set that string as PASSWORD_HASH_METHOD (existing hashes are
+upgraded on their owners' next login).
+
+Run it on the production instance type; laptop numbers do not transfer.
+
+Usage:
+    python benchmarks/bench_password_hash.py [--target-ms 100] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METHODS = [
+    # scrypt:N:r:p; memory is 128 * N * r bytes
+    'scrypt:8192:8:1',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',  # werkzeug default
+    'scrypt:65536:8:1',
+    'scrypt:131072:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',  # werkzeug pbkdf2 default
+    'pbkdf2:sha256:1000000',
+]
+
+
+def measure(method, repeat):
+    hashes, verifies = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pwhash = generate_password_hash('correct horse battery staple', method=method)
+        hashes.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert check_password_hash(pwhash, 'correct horse battery staple')
+        verifies.append(time.perf_counter() - start)
+    return statistics.median(hashes) * 1000, statistics.median(verifies) * 1000
+
+
+def memory_mib(method):
+    if not method.startswith('scrypt:'):
+        return None
+    _, n, r, _ = method.split(':')
+    return 128 * int(n) * int(r) / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-ms', type=float, default=100.0,
+                        help='verify-time budget per login')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [(method, *measure(method, args.repeat)) for method in METHODS]
+
+    picks = {}
+    for method, _, verify_ms in results:
+        family = method.split(':')[0]
+        if verify_ms <= args.target_ms:
+            picks[family] = method  # METHODS is ordered weakest to strongest
+
+    print(f"{'method':<24} {'hash ms':>8} {'verify ms':>10} {'logins/s/core':>14} {'MiB':>6}  pick")
+    for method, hash_ms, verify_ms in results:
+        mib = memory_mib(method)
+        mark = '<-- within target' if method in picks.values() else ''
+        print(f"{method:<24} {hash_ms:>8.1f} {verify_ms:>10.1f} {1000 / verify_ms:>14.1f} "
+              f"{(f'{mib:.0f}' if mib else '-'):>6}  {mark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: /services query count and latency as the number of centers grows.
+
+Renders the services page for a logged-in user against an in-memory SQLite
+database seeded with --centers and then 10x as many centers (each with a
+few live tokens), counting the SQL statements the request executes with a
+before_cursor_execute listener. The listing cache is invalidated before each
+request so every run builds the listing from the database.
+
+get_center_listing() loads every card from one grouped query, so the count
+must not depend on the number of centers; exits non-zero if it does.
+
+Usage:
+    python benchmarks/bench_services_listing.py [--centers 20] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event  # noqa: E402
+
+from __init__ import create_app  # noqa: E402
+from cache import get_cache  # noqa: E402
+from extensions import db  # noqa: E402
+from models import ServiceCenter, Token, User  # noqa: E402
+from utils import get_ist_now  # noqa: E402
+
+TOKENS_PER_CENTER = 3
+
+
+def seed(centers):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    bench_user = User(name='Bench', mobile='9000000000', email='b@bench.local', password='x')
+    db.session.add(bench_user)
+    db.session.add_all([
+        ServiceCenter(name=f'Center {c}', category='Bank', location='Nagpur', avg_service_time=10)
+        for c in range(centers)
+    ])
+    db.session.flush()
+    # Each token needs its own user: one live online token per user
+    users = [User(name=f'U{i}', mobile=f'8{i:09d}', email=f'u{i}@bench.local', password='x')
+             for i in range(centers * TOKENS_PER_CENTER)]
+    db.session.add_all(users)
+    db.session.flush()
+    now = get_ist_now()
+    db.session.add_all([
+        Token(user_id=users[i].id, service_center_id=i // TOKENS_PER_CENTER + 1, token_number=f'T{i:04d}',
+              status='Active', created_time=now, is_walkin=False)
+        for i in range(len(users))
+    ])
+    db.session.commit()
+    return bench_user.id
+
+
+def measure(app, user_id, repeat):
+    """(statements per request, median ms per request) for GET /services"""
+    statements = []
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    timings, counts = [], []
+    try:
+        for _ in range(repeat):
+            get_cache().invalidate('center_listing')
+            statements.clear()
+            start = time.perf_counter()
+            response = client.get('/services')
+            timings.append(time.perf_counter() - start)
+            counts.append(len(statements))
+            if response.status_code != 200:
+                raise RuntimeError(f"/services returned {response.status_code}")
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    timings.sort()
+    return max(counts), timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--centers', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    print(f"{'centers':>8} {'statements':>11} {'median ms':>10}")
+    counts = []
+    with app.app_context():
+        for centers in (args.centers, args.centers * 10):
+            user_id = seed(centers)
+            count, ms = measure(app, user_id, args.repeat)
+            counts.append(count)
+            print(f"{centers:>8} {count:>11} {ms:>10.1f}")
+
+    if len(set(counts)) > 1:
+        print("\nStatement count grows with the number of centers")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark: gunicorn capacity while OpenRouteService and Brevo are slow.
+
+Starts `gunicorn -c gunicorn.conf.py` against a scratch SQLite database once
+per worker class and has --clients concurrent clients hit it for --seconds.
+--slow-ratio of the requests go to /test-ors-api or /test-send-email, whose
+provider call is replaced in the server by a --provider-seconds wait (the
+real timeouts are 15 s and 10 s); the rest are /centers/search, a plain
+database read that should stay fast:
+
+  sync     - gunicorn's default: one request at a time per worker
+  gthread  - gunicorn.conf.py's default: GUNICORN_THREADS threads per worker
+  gevent   - greenlets per worker (skipped if gevent is not installed)
+
+Reports completed slow and fast requests per second, their p95 latency,
+and failed requests, with --workers workers each.
+
+Usage:
+    python benchmarks/bench_slow_providers.py [--workers 2] [--clients 32] [--seconds 15] [--provider-seconds 3]
+"""
+import argparse
+import importlib.util
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CENTERS = 50
+
+
+class _ProviderResponse:
+    def __init__(self, url):
+        self.status_code = 200 if 'openrouteservice' in url else 201
+        self.text = ''
+
+    def json(self):
+        return {'routes': [{'summary': {'duration': 900}}]}
+
+
+def _slow_post(url, timeout=None, **kwargs):
+    time.sleep(min(float(os.environ['BENCH_PROVIDER_SECONDS']), timeout or 60))
+    return _ProviderResponse(url)
+
+
+def slow_provider_app():
+    """gunicorn app factory: the real app with provider calls replaced by a wait"""
+    import requests
+    from __init__ import create_app
+
+    requests.post = _slow_post
+    return create_app()
+
+
+def seed():
+    from __init__ import create_app
+    from extensions import db
+    from models import ServiceCenter
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            ServiceCenter(name=f'Bank {c}', category='Bank', location='Nagpur', avg_service_time=10)
+            for c in range(CENTERS)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def client(base, args, deadline, results):
+    while time.monotonic() < deadline:
+        slow = random.random() < args.slow_ratio
+        path = random.choice(['/test-ors-api', '/test-send-email']) if slow else '/centers/search?q=bank'
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(base + path, timeout=60) as response:
+                response.read()
+            results['slow' if slow else 'fast'].append(time.monotonic() - start)
+        except Exception:
+            results['errors'] += 1
+
+
+def p95(samples):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * 0.95) - 1, 0)]
+
+
+def run(worker_class, env, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--pythonpath', f"{ROOT},{os.path.dirname(os.path.abspath(__file__))}",
+         'bench_slow_providers:slow_provider_app()'],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**env, 'PORT': str(port), 'GUNICORN_WORKER_CLASS': worker_class,
+             # gunicorn turns sync workers with threads > 1 into gthread
+             **({'GUNICORN_THREADS': '1'} if worker_class == 'sync' else {})},
+    )
+    try:
+        wait_for(port)
+        base = f"http://127.0.0.1:{port}"
+        # Build the search index before timing
+        urllib.request.urlopen(base + '/centers/search?q=bank', timeout=60).read()
+
+        results = {'slow': [], 'fast': [], 'errors': 0}
+        deadline = time.monotonic() + args.seconds
+        clients = [threading.Thread(target=client, args=(base, args, deadline, results))
+                   for _ in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{worker_class:>8} {len(results['slow']) / args.seconds:>8.1f} {len(results['fast']) / args.seconds:>8.1f} "
+          f"{p95(results['slow']):>12.2f} {p95(results['fast']) * 1000:>12.0f} {results['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=15.0)
+    parser.add_argument('--provider-seconds', type=float, default=3.0)
+    parser.add_argument('--slow-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            'OPENROUTESERVICE_API_KEY': 'bench',
+            'BREVO_API_KEY': 'bench',
+            'BENCH_PROVIDER_SECONDS': str(args.provider_seconds),
+            'WEB_CONCURRENCY': str(args.workers),
+        }
+        os.environ.update(env)
+        seed()
+
+        print(f"{args.workers} workers, {args.clients} clients, {args.seconds:.0f}s, "
+              f"{args.slow_ratio:.0%} of requests wait {args.provider_seconds:.0f}s on a provider")
+        print(f"{'class':>8} {'slow/s':>8} {'fast/s':>8} {'slow p95 s':>12} {'fast p95 ms':>12} {'errors':>7}")
+        for worker_class in ('sync', 'gthread', 'gevent'):
+            if worker_class == 'gevent' and importlib.util.find_spec('gevent') is None:
+                print(f"{worker_class:>8}  skipped: pip install gevent")
+                continue
+            run(worker_class, env, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Benchmark: SQLite throughput under several workers, default vs SQLITE_PRAGMAS.
+
+Starts --workers processes (as gunicorn would) against one database file and
+has each run page views for --seconds. A page view is the queue reads a
+dashboard does (serving token, queue count, the services listing GROUP BY);
+--write-ratio of them also write, the way expire_old_tokens(), call-next
+or a booking does (update one token, insert another), each in its own
+transaction. Runs it twice on a fresh file:
+
+  default  - SQLite's defaults: rollback journal, synchronous=FULL, and the
+             driver's 5 s lock timeout
+  profile  - sqlite_profile.apply_sqlite_profile() with config SQLITE_PRAGMAS
+             (WAL, synchronous=NORMAL, busy_timeout, mmap)
+
+Reports page views per second across all workers, read and write p95
+latency, and "database is locked" errors.
+
+Usage:
+    python benchmarks/bench_sqlite_concurrency.py [--workers 4] [--seconds 10] [--write-ratio 0.2]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from config import Config  # noqa: E402
+from extensions import db  # noqa: E402
+from models import ServiceCenter, Token, User  # noqa: E402
+from sqlite_profile import apply_sqlite_profile  # noqa: E402
+
+CENTERS = 20
+TOKENS_PER_CENTER = 200
+
+tokens = Token.__table__
+
+
+def make_engine(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}')
+    apply_sqlite_profile(engine, pragmas)
+    return engine
+
+
+def seed(path, pragmas):
+    engine = make_engine(path, pragmas)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {'id': 1, 'name': 'Bench', 'mobile': '9000000000', 'email': 'b@bench.local', 'password': 'x'}
+        ])
+        conn.execute(ServiceCenter.__table__.insert(), [
+            {'id': c, 'name': f'Center {c}', 'category': 'Bank', 'location': 'Nagpur', 'avg_service_time': 10}
+            for c in range(1, CENTERS + 1)
+        ])
+        conn.execute(tokens.insert(), [
+            {'user_id': 1, 'service_center_id': c, 'token_number': f'T{i:03d}',
+             'status': 'Active' if i % 4 else 'Completed', 'is_walkin': True}
+            for c in range(1, CENTERS + 1) for i in range(TOKENS_PER_CENTER)
+        ])
+    engine.dispose()
+
+
+def page_view(conn, center_id):
+    conn.execute(select(tokens.c.id).where(
+        tokens.c.service_center_id == center_id, tokens.c.status == 'Serving').limit(1)).first()
+    conn.execute(select(func.count()).where(
+        tokens.c.service_center_id == center_id, tokens.c.status == 'Active')).scalar()
+    conn.execute(select(tokens.c.service_center_id, func.count()).where(
+        tokens.c.status.in_(['Active', 'Serving'])).group_by(tokens.c.service_center_id)).all()
+
+
+def write(conn, center_id):
+    with conn.begin():
+        token_id = conn.execute(select(tokens.c.id).where(
+            tokens.c.service_center_id == center_id, tokens.c.status == 'Active').limit(1)).scalar()
+        if token_id:
+            conn.execute(update(tokens).where(tokens.c.id == token_id).values(status='Completed'))
+        conn.execute(tokens.insert().values(user_id=1, service_center_id=center_id, token_number='W',
+                                            status='Active', is_walkin=True))
+
+
+def worker(path, pragmas, seconds, write_ratio, seed_value, results):
+    random.seed(seed_value)
+    engine = make_engine(path, pragmas)
+    reads, writes, errors = [], [], 0
+    deadline = time.perf_counter() + seconds
+    with engine.connect() as conn:
+        while time.perf_counter() < deadline:
+            center_id = random.randint(1, CENTERS)
+            start = time.perf_counter()
+            try:
+                page_view(conn, center_id)
+                conn.commit()
+                if random.random() < write_ratio:
+                    write(conn, center_id)
+                    writes.append(time.perf_counter() - start)
+                else:
+                    reads.append(time.perf_counter() - start)
+            except OperationalError:
+                conn.rollback()
+                errors += 1
+    engine.dispose()
+    results.put((reads, writes, errors))
+
+
+def p95_ms(samples):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000
+
+
+def run(label, pragmas, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, pragmas)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(path, pragmas, args.seconds, args.write_ratio, i, results))
+                 for i in range(args.workers)]
+        for proc in procs:
+            proc.start()
+        reads, writes, errors = [], [], 0
+        for _ in procs:
+            r, w, e = results.get()
+            reads += r
+            writes += w
+            errors += e
+        for proc in procs:
+            proc.join()
+    views = len(reads) + len(writes)
+    print(f"{label:>8} {views / args.seconds:>11.0f} {len(writes) / args.seconds:>9.0f} "
+          f"{p95_ms(reads):>13.2f} {p95_ms(writes):>14.2f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.seconds:.0f}s, {args.write_ratio:.0%} of page views write")
+    print(f"{'profile':>8} {'views/s':>11} {'writes/s':>9} {'read p95 ms':>13} {'write p95 ms':>14} {'locked':>7}")
+    run('default', {}, args)
+    run('profile', Config.SQLITE_PRAGMAS, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: walk-in token issuance, throwaway account per walk-in vs guest identity.
+
+Issues N anonymous walk-in tokens against an in-memory SQLite database with:
+
+  legacy  - the old add_walkin() logic: a new User per walk-in with
+            generate_password_hash('walkin123'), flush, then the token
+  guest   - utils.create_walkin_token(): the token alone, owned by the shared
+            guest user, with the desk-entered name/mobile on the token
+
+Walk-ins are completed as they are issued so the 15-token lane limit never
+applies. Reports per-walk-in latency, sustained walk-ins per minute on one
+worker, and how many users rows each approach left behind.
+
+Usage:
+    python benchmarks/bench_walkin.py [--count 300]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from __init__ import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import ServiceCenter, Token, User  # noqa: E402
+from utils import create_walkin_token, get_ist_now  # noqa: E402
+
+
+def legacy_walkin_token(center_id, name):
+    """Reference copy of the pre-guest add_walkin() anonymous path"""
+    timestamp = int(get_ist_now().timestamp() * 1000000)
+    user = User(name=name, mobile=f'W{timestamp}'[:20], email=f'walkin{timestamp}@queueflow.com',
+                password=generate_password_hash('walkin123'))
+    db.session.add(user)
+    db.session.flush()
+
+    today = get_ist_now().date()
+    count = Token.query.filter(
+        Token.service_center_id == center_id,
+        db.func.date(Token.created_time) == today
+    ).count()
+    token = Token(user_id=user.id, service_center_id=center_id, token_number=f"W{count + 1:03d}",
+                  status='Active', created_time=get_ist_now(), is_walkin=True)
+    db.session.add(token)
+    db.session.commit()
+    return token
+
+
+def reset():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    center = ServiceCenter(name='Bench Center', category='Bank', location='Nagpur', avg_service_time=10)
+    db.session.add(center)
+    db.session.commit()
+    return center.id
+
+
+def run(issue, count):
+    center_id = reset()
+    users_before = User.query.count()
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        token = issue(center_id, f'Walk-in {i}')
+        timings.append(time.perf_counter() - start)
+        token.status = 'Completed'
+        db.session.commit()
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    return {
+        'mean_ms': mean * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+        'per_minute': 60 / mean,
+        'new_users': User.query.count() - users_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=300)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"{'approach':>8} {'mean ms':>9} {'p95 ms':>8} {'walk-ins/min':>13} {'users rows':>11}")
+        for label, issue in [('legacy', legacy_walkin_token), ('guest', create_walkin_token)]:
+            app.extensions.pop('queueflow_walkin_guest_id', None)
+            r = run(issue, args.count)
+            print(f"{label:>8} {r['mean_ms']:>9.3f} {r['p95_ms']:>8.3f} {r['per_minute']:>13.0f} {r['new_users']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (Blueprint, render_template, request, redirect, url_for, session, flash, jsonify,
+                   Response, abort, current_app, g, stream_with_context)
 from datetime import datetime, timedelta
-from models import User, ServiceCenter, Admin, Token
+from models import User, ServiceCenter, Admin, Token, ArchivedToken
 from extensions import db
 from auth import admin_required
-from utils import (get_ist_now, get_ist_now_aware, utc_to_ist,
+from utils import (get_ist_now, get_ist_now_aware, utc_to_ist, live_token_criteria,
                    get_serving_token, get_walkin_serving_token,
                    get_walkin_queue_count, expire_old_tokens,
-                   recalculate_queue_times, send_reset_email)
+                   create_walkin_token, WALKIN_GUEST_MOBILE, send_reset_email)
+from queue_recalc import schedule_queue_recalculation, is_recalculation_pending
+from exports import EXPORT_FORMATS, iter_token_history, parse_export_range
+from archive import archive_finished_tokens, history_page, token_history_union
+from migrations import run_migrations
+from partitions import maintain_token_partitions, partition_tokens
+from center_cache import get_center, invalidate_center
+from passwords import hash_password, verify_password
+from events import publish_queue_change, subscribe, unsubscribe
+from queue_version import get_queue_version
+from cache import get_cache
+from replica import read_replica, replica_is_fresh
+from jinja_cache import precompile_templates
+import bisect
+import click
+import json
+import queue
 import secrets
+import time
 import pytz
 
 IST = pytz.timezone('Asia/Kolkata')
@@ -16,6 +33,114 @@ IST = pytz.timezone('Asia/Kolkata')
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 
+def _queue_boundaries(serving_token, waiting_tokens):
+    """Instants (naive UTC) at which a queue view changes without a queue_version bump"""
+    boundaries = []
+    if serving_token and serving_token.actual_service_end:
+        boundaries.append(serving_token.actual_service_end)
+    for token in waiting_tokens:
+        if token.reach_time:
+            boundaries.append(token.reach_time)
+            boundaries.append(token.reach_time + timedelta(minutes=5))
+    return sorted(boundaries)
+
+
+def _dashboard_context(center_id):
+    """Template context for the dashboard and its live-updated queue panels"""
+    queue_version = get_queue_version(center_id)
+    center = get_center(center_id)
+    current_time = get_ist_now_aware()  # Use timezone-aware IST for comparisons
+    
+    # Currently Serving Token
+    serving_token = get_serving_token(center_id)
+    
+    # Get all active tokens
+    waiting_tokens = []
+    try:
+        waiting_tokens = Token.query.filter_by(
+            service_center_id=center_id, 
+            status='Active',
+            is_walkin=False
+        ).filter(*live_token_criteria()).order_by(Token.id).all()
+    except Exception as e:
+        print(f"⚠️ is_walkin column error: {e}")
+        waiting_tokens = Token.query.filter_by(
+            service_center_id=center_id, 
+            status='Active'
+        ).order_by(Token.id).all()
+    
+    # Find next eligible token - can call at arrival time
+    next_eligible_token = None
+    can_call_next = False
+    
+    if not serving_token:
+        # Counter is free, find first arrived token
+        for token in waiting_tokens:
+            if token.reach_time:
+                reach_time = utc_to_ist(token.reach_time)
+                # Can call at arrival time (no buffer blocking)
+                if current_time >= reach_time:
+                    next_eligible_token = token
+                    can_call_next = True
+                    break
+            else:
+                # No reach_time, can call immediately
+                next_eligible_token = token
+                can_call_next = True
+                break
+    
+    # Enrich tokens with status badges
+    enriched_tokens = []
+    for token in waiting_tokens:
+        try:
+            token_data = {
+                'token': token,
+                'status_badge': 'Travelling',
+                'is_late': False
+            }
+            
+            if token.reach_time:
+                reach_time = utc_to_ist(token.reach_time)
+                if current_time >= reach_time:
+                    token_data['status_badge'] = 'Arrived'
+                    # Late if > 5 min after arrival
+                    if current_time > (reach_time + timedelta(minutes=5)):
+                        token_data['status_badge'] = 'Late'
+                        token_data['is_late'] = True
+            
+            enriched_tokens.append(token_data)
+        except Exception as e:
+            print(f"⚠️ Token enrichment error: {e}")
+            continue
+    
+    # Walk-in Queue
+    walkin_serving_token = get_walkin_serving_token(center_id)
+    walkin_waiting_tokens = []
+    try:
+        walkin_waiting_tokens = Token.query.filter_by(
+            service_center_id=center_id,
+            status='Active',
+            is_walkin=True
+        ).filter(*live_token_criteria()).order_by(Token.id).all()
+    except:
+        pass
+    
+    queue_boundaries = _queue_boundaries(serving_token, waiting_tokens)
+    _remember_boundaries(center_id, queue_version, queue_boundaries)
+    
+    return dict(center=center,
+                serving_token=serving_token,
+                waiting_tokens=enriched_tokens,
+                next_eligible_token=next_eligible_token,
+                can_call_next=can_call_next,
+                walkin_serving_token=walkin_serving_token,
+                walkin_waiting_tokens=walkin_waiting_tokens,
+                queue_version=queue_version,
+                queue_boundaries=queue_boundaries,
+                current_time=current_time,
+                datetime=datetime)
+
+
 @admin_bp.route('/dashboard')
 @admin_required
 def admin_dashboard():
@@ -25,93 +150,7 @@ def admin_dashboard():
     
     try:
         center_id = session['admin_center_id']
-        center = ServiceCenter.query.get(center_id)
-        current_time = get_ist_now_aware()  # Use timezone-aware IST for comparisons
-        
-        # Currently Serving Token
-        serving_token = get_serving_token(center_id)
-        
-        # Get all active tokens
-        waiting_tokens = []
-        try:
-            waiting_tokens = Token.query.filter_by(
-                service_center_id=center_id, 
-                status='Active',
-                is_walkin=False
-            ).order_by(Token.id).all()
-        except Exception as e:
-            print(f"⚠️ is_walkin column error: {e}")
-            waiting_tokens = Token.query.filter_by(
-                service_center_id=center_id, 
-                status='Active'
-            ).order_by(Token.id).all()
-        
-        # Find next eligible token - can call at arrival time
-        next_eligible_token = None
-        can_call_next = False
-        
-        if not serving_token:
-            # Counter is free, find first arrived token
-            for token in waiting_tokens:
-                if token.reach_time:
-                    reach_time = utc_to_ist(token.reach_time)
-                    # Can call at arrival time (no buffer blocking)
-                    if current_time >= reach_time:
-                        next_eligible_token = token
-                        can_call_next = True
-                        break
-                else:
-                    # No reach_time, can call immediately
-                    next_eligible_token = token
-                    can_call_next = True
-                    break
-        
-        # Enrich tokens with status badges
-        enriched_tokens = []
-        for token in waiting_tokens:
-            try:
-                token_data = {
-                    'token': token,
-                    'status_badge': 'Travelling',
-                    'is_late': False
-                }
-                
-                if token.reach_time:
-                    reach_time = utc_to_ist(token.reach_time)
-                    if current_time >= reach_time:
-                        token_data['status_badge'] = 'Arrived'
-                        # Late if > 5 min after arrival
-                        if current_time > (reach_time + timedelta(minutes=5)):
-                            token_data['status_badge'] = 'Late'
-                            token_data['is_late'] = True
-                
-                enriched_tokens.append(token_data)
-            except Exception as e:
-                print(f"⚠️ Token enrichment error: {e}")
-                continue
-        
-        # Walk-in Queue
-        walkin_serving_token = get_walkin_serving_token(center_id)
-        walkin_waiting_tokens = []
-        try:
-            walkin_waiting_tokens = Token.query.filter_by(
-                service_center_id=center_id,
-                status='Active',
-                is_walkin=True
-            ).order_by(Token.id).all()
-        except:
-            pass
-        
-        return render_template('admin/admin_dashboard.html', 
-                             center=center,
-                             serving_token=serving_token,
-                             waiting_tokens=enriched_tokens,
-                             next_eligible_token=next_eligible_token,
-                             can_call_next=can_call_next,
-                             walkin_serving_token=walkin_serving_token,
-                             walkin_waiting_tokens=walkin_waiting_tokens,
-                             current_time=current_time,
-                             datetime=datetime)
+        return render_template('admin/admin_dashboard.html', **_dashboard_context(center_id))
     except Exception as e:
         import traceback
         print(f"❌ Admin dashboard error: {e}")
@@ -120,116 +159,229 @@ def admin_dashboard():
         return redirect(url_for('admin.admin_login'))
 
 
-@admin_bp.route('/queue-state')
-def admin_queue_state():
-    """Real-time queue state API for auto-refresh"""
-    if 'admin_id' not in session:
-        return {'error': 'Unauthorized'}, 401
+def build_queue_state(center_id, serving_token=None, waiting_tokens=None):
+    """Serving/next/queue snapshot for a center plus the times at which it goes stale
+
+    Besides version changes, the snapshot changes when a serving token's
+    time runs out and when waiting tokens become Arrived or Late; those
+    instants (naive UTC) are returned so pollers can be answered with 304
+    until the next one passes. Second counters are relative to current_time.
+    Pass serving_token and waiting_tokens together when they are already loaded.
+    """
+    current_time = get_ist_now()
+    current_time_aware = get_ist_now_aware()
     
-    try:
-        center_id = session['admin_center_id']
-        current_time = get_ist_now()
-        
+    if waiting_tokens is None:
         serving_token = get_serving_token(center_id)
         waiting_tokens = Token.query.filter_by(
             service_center_id=center_id,
             status='Active',
             is_walkin=False
-        ).order_by(Token.estimated_service_start).all()
-        
-        # Build response
-        response = {
-            'current_time': current_time.isoformat(),
-            'serving': None,
-            'next_eligible': None,
-            'can_call_next': False,
-            'queue': []
-        }
-        
-        # Serving token data
-        if serving_token:
+        ).filter(*live_token_criteria()).order_by(Token.estimated_service_start).all()
+    else:
+        waiting_tokens = sorted(waiting_tokens, key=lambda t: (t.estimated_service_start is None,
+                                                                t.estimated_service_start or datetime.min))
+    
+    state = {
+        'current_time': current_time.isoformat(),
+        'serving': None,
+        'next_eligible': None,
+        'can_call_next': False,
+        'times_updating': is_recalculation_pending(center_id),
+        'queue': []
+    }
+    
+    # Serving token data
+    if serving_token:
+        try:
+            service_end = utc_to_ist(serving_token.actual_service_end)
+            if service_end:
+                remaining_seconds = int((service_end - current_time_aware).total_seconds())
+            else:
+                remaining_seconds = 0
+            
+            state['serving'] = {
+                'token_number': serving_token.token_number,
+                'user_name': serving_token.user.name if serving_token.user else 'Unknown',
+                'remaining_seconds': max(0, remaining_seconds)
+            }
+        except Exception as e:
+            print(f"❌ Error processing serving token: {e}")
+    
+    # Check if can call next - at arrival time, not after buffer
+    if not serving_token or (serving_token.actual_service_end and serving_token.actual_service_end <= current_time):
+        for token in waiting_tokens:
             try:
-                service_end = utc_to_ist(serving_token.actual_service_end)
-                if service_end:
-                    remaining_seconds = int((service_end - current_time).total_seconds())
-                else:
-                    remaining_seconds = 0
-                
-                response['serving'] = {
-                    'token_number': serving_token.token_number,
-                    'user_name': serving_token.user.name if serving_token.user else 'Unknown',
-                    'remaining_seconds': max(0, remaining_seconds)
-                }
-            except Exception as e:
-                print(f"❌ Error processing serving token: {e}")
-        
-        # Check if can call next - at arrival time, not after buffer
-        if not serving_token or (serving_token.actual_service_end and serving_token.actual_service_end <= current_time):
-            for token in waiting_tokens:
-                try:
-                    if token.reach_time:
-                        reach_time = utc_to_ist(token.reach_time)
-                        # Can call at arrival time (no buffer blocking)
-                        if current_time >= reach_time:
-                            response['can_call_next'] = True
-                            response['next_eligible'] = {
-                                'token_number': token.token_number,
-                                'user_name': token.user.name if token.user else 'Unknown'
-                            }
-                            break
-                    else:
-                        # No reach_time, can call immediately
-                        response['can_call_next'] = True
-                        response['next_eligible'] = {
+                if token.reach_time:
+                    reach_time = utc_to_ist(token.reach_time)
+                    # Can call at arrival time (no buffer blocking)
+                    if current_time_aware >= reach_time:
+                        state['can_call_next'] = True
+                        state['next_eligible'] = {
                             'token_number': token.token_number,
                             'user_name': token.user.name if token.user else 'Unknown'
                         }
                         break
-                except Exception as e:
-                    print(f"❌ Error checking token eligibility: {e}")
-                    continue
-        
-        # Queue list
-        for token in waiting_tokens:
-            try:
-                reach_time = utc_to_ist(token.reach_time)
-                if reach_time:
-                    arrival_seconds = int((reach_time - current_time).total_seconds())
-                    status = 'Travelling'
-                    
-                    if current_time >= reach_time:
-                        status = 'Arrived'
-                        # Late if > 5 min after arrival
-                        if current_time > (reach_time + timedelta(minutes=5)):
-                            status = 'Late'
-                    
-                    response['queue'].append({
+                else:
+                    # No reach_time, can call immediately
+                    state['can_call_next'] = True
+                    state['next_eligible'] = {
                         'token_number': token.token_number,
-                        'user_name': token.user.name if token.user else 'Unknown',
-                        'arrival_seconds': arrival_seconds,
-                        'status': status
-                    })
+                        'user_name': token.user.name if token.user else 'Unknown'
+                    }
+                    break
             except Exception as e:
-                print(f"❌ Error processing queue token: {e}")
+                print(f"❌ Error checking token eligibility: {e}")
                 continue
+    
+    # Queue list
+    for token in waiting_tokens:
+        try:
+            reach_time = utc_to_ist(token.reach_time)
+            if reach_time:
+                arrival_seconds = int((reach_time - current_time_aware).total_seconds())
+                status = 'Travelling'
+                
+                if current_time_aware >= reach_time:
+                    status = 'Arrived'
+                    # Late if > 5 min after arrival
+                    if current_time_aware > (reach_time + timedelta(minutes=5)):
+                        status = 'Late'
+                
+                state['queue'].append({
+                    'token_number': token.token_number,
+                    'user_name': token.user.name if token.user else 'Unknown',
+                    'arrival_seconds': arrival_seconds,
+                    'status': status
+                })
+        except Exception as e:
+            print(f"❌ Error processing queue token: {e}")
+            continue
+    
+    return state, _queue_boundaries(serving_token, waiting_tokens)
+
+
+def _queue_state_etag(center_id, version, boundaries):
+    """Weak ETag: queue version, stale-instants passed so far, and recalculation flag"""
+    passed = bisect.bisect_right(boundaries, get_ist_now())
+    return f"{center_id}.{version}.{passed}.{int(is_recalculation_pending(center_id))}"
+
+
+def _remember_boundaries(center_id, version, boundaries):
+    get_cache().ns_set('queue_state', center_id, (version, boundaries), ttl=3600)
+
+
+def _not_modified(center_id, version):
+    """A 304 response if the client's ETag is still current, else None (reads no tokens)"""
+    if not request.if_none_match:
+        return None
+    cached = get_cache().ns_get('queue_state', center_id)
+    if cached is None or cached[0] != version:
+        return None
+    etag = _queue_state_etag(center_id, version, cached[1])
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def _with_etag(response, center_id, version, boundaries):
+    response.set_etag(_queue_state_etag(center_id, version, boundaries), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@admin_bp.route('/queue-state')
+def admin_queue_state():
+    """Real-time queue state API for auto-refresh
+
+    Honours If-None-Match: while the center's queue_version is unchanged and
+    no arrival/service deadline has passed, answers 304 without reading tokens.
+    """
+    if 'admin_id' not in session:
+        return {'error': 'Unauthorized'}, 401
+    
+    try:
+        center_id = session['admin_center_id']
+        version = get_queue_version(center_id)
+        not_modified = _not_modified(center_id, version)
+        if not_modified is not None:
+            return not_modified
         
-        return response
+        state, boundaries = build_queue_state(center_id)
+        state['version'] = version
+        _remember_boundaries(center_id, version, boundaries)
+        return _with_etag(jsonify(state), center_id, version, boundaries)
     except Exception as e:
         print(f"❌ Error in admin_queue_state: {e}")
         return {'error': 'Internal server error'}, 500
 
 
-@admin_bp.route('/call_next')
-def call_next():
+@admin_bp.route('/api/queue-panels')
+def api_queue_panels():
+    """Rendered dashboard queue panels for in-place refresh; same ETag scheme as /queue-state"""
     if 'admin_id' not in session:
-        return redirect(url_for('admin.admin_login'))
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    center_id = session['admin_center_id']
+    not_modified = _not_modified(center_id, get_queue_version(center_id))
+    if not_modified is not None:
+        return not_modified
+    
+    context = _dashboard_context(center_id)
+    response = jsonify({
+        'version': context['queue_version'],
+        'html': render_template('includes/admin_queue_counters.html', **context)
+    })
+    return _with_etag(response, center_id, context['queue_version'], context['queue_boundaries'])
+
+
+@admin_bp.route('/queue-events')
+def admin_queue_events():
+    """Server-sent events: one message per queue change at this center
+
+    Each stream ends after QUEUE_EVENTS_STREAM_SECONDS so the thread is
+    handed back; the browser reconnects and refreshes on reopen. With
+    QUEUE_EVENTS_STREAM off, answers 204, which tells EventSource to stop.
+    """
+    if 'admin_id' not in session:
+        return {'error': 'Unauthorized'}, 401
+    if not current_app.config.get('QUEUE_EVENTS_STREAM'):
+        return '', 204
     
+    center_id = session['admin_center_id']
+    deadline = time.monotonic() + current_app.config.get('QUEUE_EVENTS_STREAM_SECONDS', 300)
+    events = subscribe(center_id)
+    
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = events.get(timeout=min(25, remaining))
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: queue\ndata: {json.dumps(event)}\n\n"
+        finally:
+            unsubscribe(center_id, events)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _call_next(center_id):
+    """Finish the serving online token and serve the next arrived one; returns [(category, message)]"""
     # Auto-expire late tokens before calling next
     expire_old_tokens()
     
-    center_id = session['admin_center_id']
     current_time = get_ist_now()  # UTC for DB
     current_time_aware = get_ist_now_aware()  # IST aware for comparisons
+    messages = []
     
     try:
         serving_token = get_serving_token(center_id)
@@ -240,52 +392,55 @@ def call_next():
         serving_token.status = 'Completed'
         serving_token.completed_time = current_time
     
-    try:
-        next_token = Token.query.filter_by(
-            service_center_id=center_id,
-            status='Active',
-            is_walkin=False
-        ).order_by(Token.id).first()
-    except:
-        next_token = None
-    
-    if next_token:
+    while True:
+        try:
+            next_token = Token.query.filter_by(
+                service_center_id=center_id,
+                status='Active',
+                is_walkin=False
+            ).filter(*live_token_criteria()).order_by(Token.id).first()
+        except:
+            next_token = None
+        
+        if not next_token:
+            db.session.commit()
+            if serving_token:
+                publish_queue_change(center_id)
+            messages.append(('info', 'No tokens in queue.'))
+            return messages
+        
         # Check if token has arrived (at arrival time, not after buffer)
         if next_token.reach_time:
             reach_time = utc_to_ist(next_token.reach_time)
             if current_time_aware < reach_time:
                 db.session.commit()
-                flash(f'Token {next_token.token_number} has not arrived yet. Expected at {reach_time.strftime("%I:%M %p")}', 'warning')
-                return redirect(url_for('admin.admin_dashboard'))
+                if serving_token:
+                    publish_queue_change(center_id)
+                messages.append(('warning', f'Token {next_token.token_number} has not arrived yet. Expected at {reach_time.strftime("%I:%M %p")}'))
+                return messages
             
-            # Auto-skip if > 15 min late
+            # Auto-skip if > 15 min late, then try the next one
             if current_time_aware > (reach_time + timedelta(minutes=15)):
                 next_token.status = 'Expired'
                 next_token.no_show_reason = 'Auto-skipped: More than 15 minutes late'
                 next_token.no_show_time = current_time
                 db.session.commit()
-                flash(f'Token {next_token.token_number} auto-skipped (>15 min late). Calling next token...', 'warning')
-                return redirect(url_for('admin.call_next'))
+                publish_queue_change(center_id)
+                serving_token = None  # Already committed and announced
+                messages.append(('warning', f'Token {next_token.token_number} auto-skipped (>15 min late). Calling next token...'))
+                continue
         
         next_token.status = 'Serving'
         next_token.actual_service_start = current_time
-        next_token.actual_service_end = current_time + timedelta(minutes=ServiceCenter.query.get(center_id).avg_service_time)
-        db.session.commit()
-        flash(f'Token {next_token.token_number} is now being served.', 'success')
-    else:
+        next_token.actual_service_end = current_time + timedelta(minutes=get_center(center_id).avg_service_time)
         db.session.commit()
-        flash('No tokens in queue.', 'info')
-    
-    return redirect(url_for('admin.admin_dashboard'))
+        publish_queue_change(center_id)
+        messages.append(('success', f'Token {next_token.token_number} is now being served.'))
+        return messages
 
 
-@admin_bp.route('/call_next_walkin')
-def call_next_walkin():
-    if 'admin_id' not in session:
-        return redirect(url_for('admin.admin_login'))
-    
-    center_id = session['admin_center_id']
-    
+def _call_next_walkin(center_id):
+    """Finish the serving walk-in and serve the next one; returns [(category, message)]"""
     try:
         walkin_serving_token = get_walkin_serving_token(center_id)
     except:
@@ -300,18 +455,73 @@ def call_next_walkin():
             service_center_id=center_id,
             status='Active',
             is_walkin=True
-        ).order_by(Token.id).first()
+        ).filter(*live_token_criteria()).order_by(Token.id).first()
     except:
         next_token = None
     
     if next_token:
         next_token.status = 'Serving'
         db.session.commit()
-        flash(f'Walk-in token {next_token.token_number} is now being served.', 'success')
-    else:
-        db.session.commit()
-        flash('No walk-in tokens in queue.', 'info')
+        publish_queue_change(center_id)
+        return [('success', f'Walk-in token {next_token.token_number} is now being served.')]
     
+    db.session.commit()
+    if walkin_serving_token:
+        publish_queue_change(center_id)
+    return [('info', 'No walk-in tokens in queue.')]
+
+
+def _complete_token(token):
+    token.status = 'Completed'
+    token.completed_time = get_ist_now()
+    db.session.commit()
+    publish_queue_change(token.service_center_id)
+    return [('success', 'Token marked as completed.')]
+
+
+def _mark_no_show(token, reason):
+    center_id = token.service_center_id
+    token.status = 'Expired'
+    token.no_show_reason = reason
+    token.no_show_time = get_ist_now()
+    
+    user = User.query.get(token.user_id)
+    if user.mobile != WALKIN_GUEST_MOBILE:
+        user.no_show_count += 1
+    
+    db.session.commit()
+    publish_queue_change(center_id)
+    
+    # Recalculate queue times for remaining tokens
+    schedule_queue_recalculation(center_id, token.id)
+    return [('warning', 'Token marked as no-show with reason recorded.')]
+
+
+def _center_token_or_404(token_id):
+    """A token of the logged-in admin's center"""
+    token = Token.query.get_or_404(token_id)
+    if token.service_center_id != session['admin_center_id']:
+        abort(404)
+    return token
+
+
+@admin_bp.route('/call_next')
+def call_next():
+    if 'admin_id' not in session:
+        return redirect(url_for('admin.admin_login'))
+    
+    for category, message in _call_next(session['admin_center_id']):
+        flash(message, category)
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+@admin_bp.route('/call_next_walkin')
+def call_next_walkin():
+    if 'admin_id' not in session:
+        return redirect(url_for('admin.admin_login'))
+    
+    for category, message in _call_next_walkin(session['admin_center_id']):
+        flash(message, category)
     return redirect(url_for('admin.admin_dashboard'))
 
 
@@ -320,11 +530,8 @@ def complete_token(token_id):
     if 'admin_id' not in session:
         return redirect(url_for('admin.admin_login'))
     
-    token = Token.query.get_or_404(token_id)
-    token.status = 'Completed'
-    token.completed_time = get_ist_now()
-    db.session.commit()
-    flash('Token marked as completed.', 'success')
+    for category, message in _complete_token(_center_token_or_404(token_id)):
+        flash(message, category)
     return redirect(url_for('admin.admin_dashboard'))
 
 
@@ -333,7 +540,7 @@ def no_show(token_id):
     if 'admin_id' not in session:
         return redirect(url_for('admin.admin_login'))
     
-    token = Token.query.get_or_404(token_id)
+    token = _center_token_or_404(token_id)
     
     if request.method == 'POST':
         reason = request.form.get('reason', '').strip()
@@ -347,25 +554,68 @@ def no_show(token_id):
         if notes:
             full_reason += f" - {notes}"
         
-        center_id = token.service_center_id
-        token.status = 'Expired'
-        token.no_show_reason = full_reason
-        token.no_show_time = get_ist_now()
-        
-        user = User.query.get(token.user_id)
-        user.no_show_count += 1
-        
-        db.session.commit()
-        
-        # Recalculate queue times for remaining tokens
-        recalculate_queue_times(center_id)
-        
-        flash('Token marked as no-show with reason recorded.', 'warning')
+        for category, message in _mark_no_show(token, full_reason):
+            flash(message, category)
         return redirect(url_for('admin.admin_dashboard'))
     
     return render_template('admin/no_show_form.html', token=token)
 
 
+def _action_response(center_id, messages):
+    """JSON result of a dashboard action: messages plus the updated queue snapshot"""
+    context = _dashboard_context(center_id)
+    # Reuse the tokens the panels were rendered from instead of querying them again
+    state, _ = build_queue_state(center_id, context['serving_token'],
+                                 [item['token'] for item in context['waiting_tokens']])
+    state['version'] = context['queue_version']
+    return jsonify({
+        'messages': [{'category': category, 'message': message} for category, message in messages],
+        'version': context['queue_version'],
+        'state': state,
+        'html': render_template('includes/admin_queue_counters.html', **context)
+    })
+
+
+@admin_bp.route('/api/call-next', methods=['POST'])
+def api_call_next():
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    center_id = session['admin_center_id']
+    return _action_response(center_id, _call_next(center_id))
+
+
+@admin_bp.route('/api/call-next-walkin', methods=['POST'])
+def api_call_next_walkin():
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    center_id = session['admin_center_id']
+    return _action_response(center_id, _call_next_walkin(center_id))
+
+
+@admin_bp.route('/api/complete/<int:token_id>', methods=['POST'])
+def api_complete_token(token_id):
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    token = _center_token_or_404(token_id)
+    return _action_response(token.service_center_id, _complete_token(token))
+
+
+@admin_bp.route('/api/no-show/<int:token_id>', methods=['POST'])
+def api_no_show(token_id):
+    """Body (JSON or form): reason (required), notes"""
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    token = _center_token_or_404(token_id)
+    data = request.get_json(silent=True) or request.form
+    reason = (data.get('reason') or '').strip()
+    notes = (data.get('notes') or '').strip()
+    if not reason:
+        return jsonify({'error': 'Please provide a reason for marking as no-show.'}), 400
+    if notes:
+        reason += f" - {notes}"
+    return _action_response(token.service_center_id, _mark_no_show(token, reason))
+
+
 @admin_bp.route('/add_walkin', methods=['GET', 'POST'])
 def add_walkin():
     if 'admin_id' not in session:
@@ -376,7 +626,7 @@ def add_walkin():
         flash('Session expired. Please login again.', 'danger')
         return redirect(url_for('admin.admin_login'))
     
-    center = ServiceCenter.query.get(center_id)
+    center = get_center(center_id)
     if not center:
         flash('Service center not found.', 'danger')
         return redirect(url_for('admin.admin_login'))
@@ -393,38 +643,9 @@ def add_walkin():
             except:
                 pass
             
-            # Create or get user
-            if mobile and len(mobile) == 10:
-                user = User.query.filter_by(mobile=mobile).first()
-                if not user:
-                    user = User(name=name, mobile=mobile, password=generate_password_hash('walkin123'))
-                    db.session.add(user)
-                    db.session.flush()
-            else:
-                # Anonymous walk-in
-                timestamp = int(get_ist_now().timestamp())
-                user = User(name=name, mobile=f'W{timestamp}', email=f'walkin{timestamp}@queueflow.com', password=generate_password_hash('walkin123'))
-                db.session.add(user)
-                db.session.flush()
-            
-            # Generate token with W prefix
-            today = get_ist_now().date()
-            count = Token.query.filter(
-                Token.service_center_id == center_id,
-                db.func.date(Token.created_time) == today
-            ).count()
-            token_number = f"W{count + 1:03d}"
-            
-            token = Token(
-                user_id=user.id,
-                service_center_id=center_id,
-                token_number=token_number,
-                status='Active',
-                created_time=get_ist_now(),
-                is_walkin=True
-            )
-            db.session.add(token)
-            db.session.commit()
+            token = create_walkin_token(center_id, name, mobile)
+            token_number = token.token_number
+            publish_queue_change(center_id)
             
             flash(f'Walk-in token {token_number} created successfully!', 'success')
             return redirect(url_for('admin.token_qr', token_number=token_number))
@@ -440,22 +661,132 @@ def add_walkin():
 
 
 @admin_bp.route('/history')
+@read_replica()
 def admin_history():
     if 'admin_id' not in session:
         return redirect(url_for('admin.admin_login'))
     
     center_id = session['admin_center_id']
-    center = ServiceCenter.query.get(center_id)
+    center = get_center(center_id)
     
+    next_cursor = None
     try:
-        tokens = Token.query.filter_by(service_center_id=center_id).filter(
-            Token.status.in_(['Completed', 'Expired'])
-        ).order_by(Token.created_time.desc()).limit(100).all()
+        tokens, next_cursor = history_page(
+            lambda model: [model.service_center_id == center_id, model.status.in_(['Completed', 'Expired'])],
+            cursor=request.args.get('before'), per_page=100
+        )
     except Exception as e:
         print(f"❌ Error fetching history: {e}")
         tokens = []
     
-    return render_template('admin/admin_history.html', center=center, tokens=tokens, IST=IST, datetime=datetime)
+    return render_template('admin/admin_history.html', center=center, tokens=tokens, next_cursor=next_cursor,
+                           IST=IST, datetime=datetime)
+
+
+@admin_bp.route('/history/export')
+@read_replica()
+def admin_history_export():
+    """Stream the center's token history for an IST date range as CSV or NDJSON"""
+    if 'admin_id' not in session:
+        return redirect(url_for('admin.admin_login'))
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return {'error': f'Unsupported format: {fmt}'}, 400
+    
+    today = get_ist_now_aware().strftime('%Y-%m-%d')
+    start = request.args.get('start', today)
+    end = request.args.get('end', today)
+    try:
+        start_utc, end_utc = parse_export_range(start, end)
+    except ValueError:
+        return {'error': 'start and end must be YYYY-MM-DD'}, 400
+    
+    generate, mimetype = EXPORT_FORMATS[fmt]
+    batches = iter_token_history(session['admin_center_id'], start_utc, end_utc)
+    return Response(
+        stream_with_context(generate(batches)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=token-history-{start}-to-{end}.{fmt}'}
+    )
+
+
+@admin_bp.cli.command('export-history')
+@click.argument('center_id', type=int)
+@click.option('--start', required=True, help='First IST day, YYYY-MM-DD')
+@click.option('--end', required=True, help='Last IST day (inclusive), YYYY-MM-DD')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--replica', is_flag=True, help='Read from the replica when it is fresh enough')
+def export_history_command(center_id, start, end, fmt, output, replica):
+    """Export a center's token history: flask admin export-history CENTER_ID --start ... --end ..."""
+    g.read_replica = replica and replica_is_fresh()
+    start_utc, end_utc = parse_export_range(start, end)
+    generate, _ = EXPORT_FORMATS[fmt]
+    for chunk in generate(iter_token_history(center_id, start_utc, end_utc)):
+        output.write(chunk)
+
+
+@admin_bp.cli.command('archive-tokens')
+@click.option('--older-than-days', type=int, default=None, help='Defaults to TOKEN_ARCHIVE_AFTER_DAYS')
+@click.option('--batch-size', type=int, default=None, help='Defaults to TOKEN_ARCHIVE_BATCH_SIZE')
+@click.option('--dry-run', is_flag=True, help='Only count the tokens that would be archived')
+def archive_tokens_command(older_than_days, batch_size, dry_run):
+    """Move old finished tokens into tokens_archive: flask admin archive-tokens"""
+    count = archive_finished_tokens(older_than_days, batch_size, dry_run=dry_run)
+    click.echo(f"{'Would archive' if dry_run else 'Archived'} {count} tokens")
+
+
+@admin_bp.cli.command('migrate')
+@click.option('--dry-run', is_flag=True, help='Print the plan and run pre-flight checks without changing anything')
+@click.option('--target', default=None, help='Stop after this version')
+def migrate_command(dry_run, target):
+    """Apply pending schema migrations: flask admin migrate [--dry-run]"""
+    try:
+        versions, problems = run_migrations(target=target, dry_run=dry_run)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--target')
+    if problems:
+        raise click.ClickException(f"{len(problems)} pre-flight check(s) failed; nothing was applied")
+    if not versions:
+        click.echo("Schema is up to date")
+    elif dry_run:
+        click.echo(f"{len(versions)} pending version(s); rerun without --dry-run to apply")
+
+
+@admin_bp.cli.command('partition-tokens')
+@click.option('--months-ahead', type=int, default=None, help='Defaults to TOKEN_PARTITION_MONTHS_AHEAD')
+@click.option('--dry-run', is_flag=True, help='Print the conversion statements without running them')
+def partition_tokens_command(months_ahead, dry_run):
+    """Convert tokens to monthly partitions (PostgreSQL, one-off): flask admin partition-tokens"""
+    statements = partition_tokens(months_ahead, dry_run=dry_run)
+    if not statements:
+        click.echo("tokens is already partitioned")
+        return
+    for statement in statements:
+        click.echo(f"{statement};")
+    if not dry_run:
+        click.echo("Partitioned tokens; drop tokens_unpartitioned once verified, then set TOKEN_PARTITIONING=1")
+
+
+@admin_bp.cli.command('maintain-token-partitions')
+@click.option('--months-ahead', type=int, default=None, help='Defaults to TOKEN_PARTITION_MONTHS_AHEAD')
+@click.option('--dry-run', is_flag=True, help='Only list the partitions that would be created or retired')
+def maintain_token_partitions_command(months_ahead, dry_run):
+    """Create upcoming token partitions and retire expired ones: flask admin maintain-token-partitions"""
+    created, retired = maintain_token_partitions(months_ahead, dry_run=dry_run)
+    prefix = 'Would ' if dry_run else ''
+    click.echo(f"{prefix}{'create' if dry_run else 'Created'}: {', '.join(created) or 'none'}")
+    click.echo(f"{prefix}{'retire' if dry_run else 'Retired'}: {', '.join(retired) or 'none'}")
+
+
+@admin_bp.cli.command('precompile-templates')
+def precompile_templates_command():
+    """Fill the Jinja bytecode cache at build time: flask admin precompile-templates"""
+    if current_app.jinja_env.bytecode_cache is None:
+        raise click.ClickException("JINJA_BYTECODE_CACHE_DIR is not set or not writable")
+    names = precompile_templates(current_app)
+    click.echo(f"Compiled {len(names)} templates into {current_app.config['JINJA_BYTECODE_CACHE_DIR']}")
 
 
 @admin_bp.route('/analytics')
@@ -465,7 +796,7 @@ def admin_analytics():
         return redirect(url_for('admin.admin_login'))
     
     center_id = session['admin_center_id']
-    center = ServiceCenter.query.get(center_id)
+    center = get_center(center_id)
     
     if not center:
         flash('Service center not found', 'danger')
@@ -475,6 +806,7 @@ def admin_analytics():
 
 
 @admin_bp.route('/api/analytics')
+@read_replica()
 def api_admin_analytics():
     """JSON endpoint for admin analytics data"""
     if 'admin_id' not in session:
@@ -483,20 +815,24 @@ def api_admin_analytics():
     center_id = session['admin_center_id']
     today = datetime.now().date()
     
+    # Live and archived tokens of this center, read as one table
+    tokens = token_history_union(
+        'id', 'created_time', 'status', 'is_walkin',
+        where=lambda model: [model.service_center_id == center_id]
+    )
+    
     # Daily customers
-    daily_customers = Token.query.filter(
-        Token.service_center_id == center_id,
-        db.func.date(Token.created_time) == today
-    ).count()
+    daily_customers = db.session.query(db.func.count(tokens.c.id)).filter(
+        db.func.date(tokens.c.created_time) == today
+    ).scalar()
     
     # Last 7 days trend — single GROUP BY query instead of 7 separate count queries
     seven_days_ago = today - timedelta(days=6)
     trend_rows = db.session.query(
-        db.func.date(Token.created_time).label('day'),
-        db.func.count(Token.id).label('cnt')
+        db.func.date(tokens.c.created_time).label('day'),
+        db.func.count(tokens.c.id).label('cnt')
     ).filter(
-        Token.service_center_id == center_id,
-        db.func.date(Token.created_time) >= seven_days_ago
+        db.func.date(tokens.c.created_time) >= seven_days_ago
     ).group_by('day').all()
     trend_map = {str(row.day): row.cnt for row in trend_rows}
     trend_data = []
@@ -504,21 +840,24 @@ def api_admin_analytics():
         date = today - timedelta(days=i)
         trend_data.append({'date': date.strftime('%a'), 'count': trend_map.get(str(date), 0)})
     
-    # Online vs Walk-in
-    total_tokens = Token.query.filter_by(service_center_id=center_id).count()
-    walkin_tokens = Token.query.filter_by(service_center_id=center_id, is_walkin=True).count()
+    # Online vs Walk-in and status breakdown in one pass
+    totals = db.session.query(
+        db.func.count(tokens.c.id).label('total'),
+        db.func.count(db.case((tokens.c.is_walkin == True, 1))).label('walkin'),
+        db.func.count(db.case((tokens.c.status == 'Completed', 1))).label('completed'),
+        db.func.count(db.case((tokens.c.status == 'No Show', 1))).label('no_show'),
+        db.func.count(db.case((tokens.c.status == 'Expired', 1))).label('expired')
+    ).one()
+    total_tokens = totals.total
+    walkin_tokens = totals.walkin
     online_tokens = total_tokens - walkin_tokens
-    
-    # Status breakdown
-    completed = Token.query.filter_by(service_center_id=center_id, status='Completed').count()
-    no_show = Token.query.filter_by(service_center_id=center_id, status='No Show').count()
-    expired = Token.query.filter_by(service_center_id=center_id, status='Expired').count()
+    completed, no_show, expired = totals.completed, totals.no_show, totals.expired
     
     # Peak hours — use SQL GROUP BY instead of fetching all tokens into Python
     peak_hours_query = db.session.query(
-        db.func.strftime('%H', Token.created_time).label('hour'),
-        db.func.count(Token.id).label('cnt')
-    ).filter_by(service_center_id=center_id).group_by('hour').order_by(db.desc('cnt')).limit(5).all()
+        db.func.strftime('%H', tokens.c.created_time).label('hour'),
+        db.func.count(tokens.c.id).label('cnt')
+    ).group_by('hour').order_by(db.desc('cnt')).limit(5).all()
     peak_hours = [(int(h), c) for h, c in peak_hours_query if h is not None]
     
     return jsonify({
@@ -546,12 +885,12 @@ def generate_demo_data():
     
     try:
         center_id = session['admin_center_id']
-        center = ServiceCenter.query.get(center_id)
+        center = get_center(center_id)
         
         # Get or create demo user
         demo_user = User.query.filter_by(mobile='0000000000').first()
         if not demo_user:
-            demo_user = User(name='Demo User', mobile='0000000000', email='demo@queueflow.com', password=generate_password_hash('demo123'))
+            demo_user = User(name='Demo User', mobile='0000000000', email='demo@queueflow.com', password=hash_password('demo123'))
             db.session.add(demo_user)
             db.session.commit()
         
@@ -618,6 +957,7 @@ def admin_profile():
             admin.email = request.form.get('admin_email', '').strip()
             
             db.session.commit()
+            invalidate_center(center_id)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('admin.admin_profile'))
         except Exception as e:
@@ -672,84 +1012,6 @@ def update_all_coordinates():
     return "".join(results)
 
 
-@admin_bp.route('/migrate-db-add-column')
-def migrate_db():
-    """Manual migration endpoint to add missing columns"""
-    results = []
-    try:
-        with db.engine.connect() as conn:
-            # Fix mobile column length for walk-in users
-            try:
-                conn.execute(db.text("ALTER TABLE users ALTER COLUMN mobile TYPE VARCHAR(20)"))
-                conn.commit()
-                results.append("✅ Updated mobile column to VARCHAR(20)")
-            except Exception as e:
-                results.append(f"⚠️ mobile column: {str(e)}")
-            
-            # Add new service center columns
-            service_center_columns = [
-                ('description', 'VARCHAR(500)'),
-                ('phone', 'VARCHAR(15)'),
-                ('email', 'VARCHAR(100)'),
-                ('website', 'VARCHAR(100)'),
-                ('business_hours', 'VARCHAR(100)'),
-                ('services_offered', 'VARCHAR(500)'),
-                ('facilities', 'VARCHAR(500)')
-            ]
-            
-            for col_name, col_type in service_center_columns:
-                try:
-                    result = conn.execute(db.text(
-                        f"SELECT column_name FROM information_schema.columns "
-                        f"WHERE table_name='service_centers' AND column_name='{col_name}'"
-                    ))
-                    if not result.fetchone():
-                        conn.execute(db.text(
-                            f"ALTER TABLE service_centers ADD COLUMN {col_name} {col_type}"
-                        ))
-                        conn.commit()
-                        results.append(f"✅ Added {col_name} column to service_centers")
-                    else:
-                        results.append(f"ℹ️ {col_name} column already exists")
-                except Exception as e:
-                    results.append(f"⚠️ {col_name}: {str(e)}")
-            
-            # Add new token columns for fixed times
-            token_columns = [
-                ('leave_time', 'TIMESTAMP'),
-                ('reach_time', 'TIMESTAMP'),
-                ('estimated_service_start', 'TIMESTAMP'),
-                ('estimated_service_end', 'TIMESTAMP'),
-                ('actual_service_start', 'TIMESTAMP'),
-                ('actual_service_end', 'TIMESTAMP'),
-                ('completed_time', 'TIMESTAMP'),
-                ('no_show_reason', 'VARCHAR(500)'),
-                ('no_show_time', 'TIMESTAMP'),
-                ('is_walkin', 'BOOLEAN DEFAULT FALSE')
-            ]
-            
-            for col_name, col_type in token_columns:
-                try:
-                    result = conn.execute(db.text(
-                        f"SELECT column_name FROM information_schema.columns "
-                        f"WHERE table_name='tokens' AND column_name='{col_name}'"
-                    ))
-                    if not result.fetchone():
-                        conn.execute(db.text(
-                            f"ALTER TABLE tokens ADD COLUMN {col_name} {col_type}"
-                        ))
-                        conn.commit()
-                        results.append(f"✅ Added {col_name} column to tokens")
-                    else:
-                        results.append(f"ℹ️ {col_name} column already exists")
-                except Exception as e:
-                    results.append(f"⚠️ {col_name}: {str(e)}")
-            
-            return "<h2>Migration Results</h2>" + "".join([f"<p>{r}</p>" for r in results])
-    except Exception as e:
-        return f"<h2>Migration Error</h2><p>❌ {str(e)}</p>"
-
-
 @admin_bp.route('/debug/verify-timing-system')
 def debug_verify_timing():
     """Debug endpoint to verify timing system works for all service centers"""
@@ -831,7 +1093,7 @@ def admin_reset_password(token):
     
     if request.method == 'POST':
         new_password = request.form.get('password')
-        admin.password = generate_password_hash(new_password)
+        admin.password = hash_password(new_password)
         admin.reset_token = None
         admin.reset_token_expiry = None
         db.session.commit()
@@ -849,7 +1111,8 @@ def admin_login():
         password = request.form['password']
         
         admin = Admin.query.filter_by(username=username).first()
-        if admin and check_password_hash(admin.password, password):
+        if verify_password(admin, password):
+            db.session.commit()  # Persists a rehashed password
             session['admin_id'] = admin.id
             session['admin_center_id'] = admin.service_center_id
             return redirect(url_for('admin.admin_dashboard'))
@@ -876,6 +1139,7 @@ def admin_delete_center():
     
     # Delete all tokens for this center
     Token.query.filter_by(service_center_id=center_id).delete()
+    ArchivedToken.query.filter_by(service_center_id=center_id).delete()
     
     # Delete admin account
     Admin.query.filter_by(service_center_id=center_id).delete()
@@ -883,6 +1147,7 @@ def admin_delete_center():
     # Delete the service center
     db.session.delete(center)
     db.session.commit()
+    invalidate_center(center_id)
     
     # Logout admin
     session.clear()
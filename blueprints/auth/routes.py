@@ -1,12 +1,12 @@
 import secrets
 from flask import render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import timedelta
 
 from blueprints.auth import auth_bp
 from extensions import db
 from models import User, Admin, SuperAdmin, ServiceCenterRegistration
-from utils import get_ist_now, send_reset_email
+from utils import get_ist_now, send_reset_email, WALKIN_GUEST_MOBILE
+from passwords import hash_password, verify_password
 from auth import owner_required
 
 
@@ -37,7 +37,7 @@ def register():
                     name=name,
                     mobile=mobile,
                     email=email,
-                    password=generate_password_hash(password)
+                    password=hash_password(password)
                 )
                 db.session.add(user)
                 db.session.commit()
@@ -74,7 +74,8 @@ def login():
                 (ServiceCenterRegistration.phone == identifier) |
                 (ServiceCenterRegistration.email == identifier)
             ).first()
-            if owner and check_password_hash(owner.password, password):
+            if verify_password(owner, password):
+                db.session.commit()  # Persists a rehashed password
                 session['owner_id'] = owner.id
                 session['owner_name'] = owner.owner_name
                 return redirect(url_for('auth.owner_dashboard'))
@@ -82,9 +83,11 @@ def login():
             # Check if regular user
             user = User.query.filter(
                 (User.mobile == identifier) |
-                (User.email == identifier)
+                (User.email == identifier),
+                User.mobile != WALKIN_GUEST_MOBILE
             ).first()
-            if user and check_password_hash(user.password, password):
+            if verify_password(user, password):
+                db.session.commit()
                 session['user_id'] = user.id
                 session['user_name'] = user.name
                 return redirect(url_for('user.services'))
@@ -116,7 +119,7 @@ def forgot_password():
             return render_template('auth/forgot_password.html')
 
         user = User.query.filter_by(mobile=mobile).first()
-        if not user:
+        if not user or user.mobile == WALKIN_GUEST_MOBILE:
             flash('Mobile number not registered!', 'danger')
             return render_template('auth/forgot_password.html')
 
@@ -134,6 +137,7 @@ def forgot_password():
         reset_token = secrets.token_urlsafe(32)
         user.reset_token = reset_token
         user.reset_token_expiry = get_ist_now() + timedelta(hours=1)
+        email = user.email
         db.session.commit()
 
         # Flash success immediately (don't wait for email)
@@ -141,10 +145,10 @@ def forgot_password():
 
         # Send email (non-blocking)
         reset_link = url_for('auth.reset_password', token=reset_token, _external=True)
-        print(f"🔐 Attempting to send reset email to {user.email}")
+        print(f"🔐 Attempting to send reset email to {email}")
 
         try:
-            send_reset_email(user.email, reset_link, "User")
+            send_reset_email(email, reset_link, "User")
         except Exception as e:
             print(f"❌ Email send failed: {e}")
 
@@ -163,7 +167,7 @@ def reset_password(token):
 
     if request.method == 'POST':
         new_password = request.form.get('password')
-        user.password = generate_password_hash(new_password)
+        user.password = hash_password(new_password)
         user.reset_token = None
         user.reset_token_expiry = None
         db.session.commit()
@@ -211,7 +215,7 @@ def admin_reset_password(token):
 
     if request.method == 'POST':
         new_password = request.form.get('password')
-        admin.password = generate_password_hash(new_password)
+        admin.password = hash_password(new_password)
         admin.reset_token = None
         admin.reset_token_expiry = None
         db.session.commit()
@@ -1,9 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-from models import User, ServiceCenter, Admin, Token, SuperAdmin, ServiceCenterRegistration
+from models import User, ServiceCenter, Admin, Token, ArchivedToken, SuperAdmin, ServiceCenterRegistration
 from extensions import db
 from auth import superadmin_required
+from utils import keyset_page
+from archive import token_history_union
+from cache import get_cache
+from center_cache import invalidate_center, center_cache_stats
+from replica import read_replica
+from passwords import hash_password, verify_password
 
 superadmin_bp = Blueprint('superadmin', __name__, url_prefix='/superadmin')
 
@@ -15,7 +20,8 @@ def superadmin_login():
         password = request.form['password']
         
         super_admin = SuperAdmin.query.filter_by(username=username).first()
-        if super_admin and check_password_hash(super_admin.password, password):
+        if verify_password(super_admin, password):
+            db.session.commit()  # Persists a rehashed password
             session['superadmin_id'] = super_admin.id
             session['superadmin_username'] = super_admin.username
             return redirect(url_for('superadmin.superadmin_dashboard'))
@@ -29,9 +35,21 @@ def superadmin_login():
 @superadmin_required
 def superadmin_dashboard():
     
-    pending = ServiceCenterRegistration.query.filter_by(status='Pending').order_by(ServiceCenterRegistration.submitted_time.desc()).all()
-    approved = ServiceCenterRegistration.query.filter_by(status='Approved').order_by(ServiceCenterRegistration.reviewed_time.desc()).limit(10).all()
-    rejected = ServiceCenterRegistration.query.filter_by(status='Rejected').order_by(ServiceCenterRegistration.reviewed_time.desc()).limit(10).all()
+    pending, pending_next = keyset_page(
+        ServiceCenterRegistration.query.filter_by(status='Pending'),
+        ServiceCenterRegistration.submitted_time, ServiceCenterRegistration.id,
+        cursor=request.args.get('pending_before'), per_page=25
+    )
+    approved, approved_next = keyset_page(
+        ServiceCenterRegistration.query.filter_by(status='Approved'),
+        ServiceCenterRegistration.reviewed_time, ServiceCenterRegistration.id,
+        cursor=request.args.get('approved_before'), per_page=10
+    )
+    rejected, rejected_next = keyset_page(
+        ServiceCenterRegistration.query.filter_by(status='Rejected'),
+        ServiceCenterRegistration.reviewed_time, ServiceCenterRegistration.id,
+        cursor=request.args.get('rejected_before'), per_page=10
+    )
     
     stats = {
         'pending': ServiceCenterRegistration.query.filter_by(status='Pending').count(),
@@ -44,6 +62,9 @@ def superadmin_dashboard():
                          pending=pending, 
                          approved=approved, 
                          rejected=rejected,
+                         pending_next=pending_next,
+                         approved_next=approved_next,
+                         rejected_next=rejected_next,
                          stats=stats)
 
 
@@ -81,7 +102,7 @@ def approve_registration(reg_id):
     admin = Admin(
         username=admin_username,
         email=registration.email,
-        password=generate_password_hash(admin_password),
+        password=hash_password(admin_password),
         service_center_id=service_center.id
     )
     db.session.add(admin)
@@ -153,9 +174,10 @@ def superadmin_edit_admin(admin_id):
             # Update password if provided
             new_password = request.form.get('new_password', '').strip()
             if new_password:
-                admin.password = generate_password_hash(new_password)
+                admin.password = hash_password(new_password)
             
             db.session.commit()
+            invalidate_center(center.id)
             flash('Admin and service center details updated successfully!', 'success')
             return redirect(url_for('superadmin.superadmin_admins'))
         except Exception as e:
@@ -190,6 +212,7 @@ def superadmin_delete_center(center_id):
     
     # Delete all tokens for this center
     Token.query.filter_by(service_center_id=center_id).delete()
+    ArchivedToken.query.filter_by(service_center_id=center_id).delete()
     
     # Delete admin accounts for this center
     Admin.query.filter_by(service_center_id=center_id).delete()
@@ -197,6 +220,7 @@ def superadmin_delete_center(center_id):
     # Delete the service center
     db.session.delete(center)
     db.session.commit()
+    invalidate_center(center_id)
     
     flash(f'Service center "{center_name}" deleted successfully!', 'success')
     return redirect(url_for('superadmin.superadmin_manage_centers'))
@@ -216,6 +240,7 @@ def superadmin_manage_centers():
 
 
 @superadmin_bp.route('/api/analytics')
+@read_replica()
 def api_superadmin_analytics():
     """JSON endpoint for super admin system-wide analytics"""
     if 'superadmin_id' not in session:
@@ -226,15 +251,20 @@ def api_superadmin_analytics():
     # System-wide stats
     total_centers = ServiceCenter.query.count()
     total_users = User.query.count()
-    daily_tokens = Token.query.filter(db.func.date(Token.created_time) == today).count()
+    
+    # Live and archived tokens, read as one table (as admin analytics does)
+    tokens = token_history_union('id', 'service_center_id', 'created_time', 'status', 'is_walkin')
+    daily_tokens = db.session.query(db.func.count(tokens.c.id)).filter(
+        db.func.date(tokens.c.created_time) == today
+    ).scalar()
     
     # Last 7 days trend (system-wide) — single GROUP BY query
     seven_days_ago = today - timedelta(days=6)
     trend_rows = db.session.query(
-        db.func.date(Token.created_time).label('day'),
-        db.func.count(Token.id).label('cnt')
+        db.func.date(tokens.c.created_time).label('day'),
+        db.func.count(tokens.c.id).label('cnt')
     ).filter(
-        db.func.date(Token.created_time) >= seven_days_ago
+        db.func.date(tokens.c.created_time) >= seven_days_ago
     ).group_by('day').all()
     trend_map = {str(row.day): row.cnt for row in trend_rows}
     trend_data = []
@@ -242,21 +272,26 @@ def api_superadmin_analytics():
         date = today - timedelta(days=i)
         trend_data.append({'date': date.strftime('%a'), 'count': trend_map.get(str(date), 0)})
     
-    # Online vs Walk-in (system-wide)
-    total_tokens = Token.query.count()
-    walkin_tokens = Token.query.filter_by(is_walkin=True).count()
+    # Online vs Walk-in and status breakdown (system-wide) in one pass
+    totals = db.session.query(
+        db.func.count(tokens.c.id).label('total'),
+        db.func.count(db.case((tokens.c.is_walkin == True, 1))).label('walkin'),
+        db.func.count(db.case((tokens.c.status == 'Completed', 1))).label('completed'),
+        db.func.count(db.case((tokens.c.status == 'No Show', 1))).label('no_show'),
+        db.func.count(db.case((tokens.c.status == 'Expired', 1))).label('expired')
+    ).one()
+    total_tokens = totals.total
+    walkin_tokens = totals.walkin
     online_tokens = total_tokens - walkin_tokens
-    
-    # Status breakdown (system-wide)
-    completed = Token.query.filter_by(status='Completed').count()
-    no_show = Token.query.filter_by(status='No Show').count()
-    expired = Token.query.filter_by(status='Expired').count()
+    completed, no_show, expired = totals.completed, totals.no_show, totals.expired
     
     # Top performing centers
     top_centers = db.session.query(
         ServiceCenter.name,
-        db.func.count(Token.id).label('token_count')
-    ).join(Token).group_by(ServiceCenter.id).order_by(db.desc('token_count')).limit(5).all()
+        db.func.count(tokens.c.id).label('token_count')
+    ).join(tokens, tokens.c.service_center_id == ServiceCenter.id).group_by(
+        ServiceCenter.id, ServiceCenter.name
+    ).order_by(db.desc('token_count')).limit(5).all()
     
     return jsonify({
         'total_centers': total_centers,
@@ -275,3 +310,15 @@ def api_superadmin_analytics():
         },
         'top_centers': [{'name': name, 'count': count} for name, count in top_centers]
     })
+
+
+@superadmin_bp.route('/api/cache-stats')
+def api_superadmin_cache_stats():
+    """JSON hit/miss counters for this worker's service center cache"""
+    if 'superadmin_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return jsonify({
+        'backend': type(get_cache()).__name__,
+        'center_cache': center_cache_stats()
+    })
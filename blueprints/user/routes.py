@@ -1,18 +1,28 @@
-from flask import render_template, request, redirect, url_for, session, flash
+from flask import render_template, request, redirect, url_for, session, flash, current_app, jsonify
 from datetime import timedelta
+from sqlalchemy.exc import IntegrityError
 
 from blueprints.user import user_bp
 from extensions import db
 from models import Token, ServiceCenter, User
 from utils import (
     get_ist_now, get_ist_now_aware, utc_to_ist,
-    get_active_token_for_user, get_queue_count, get_serving_token,
+    get_active_token_for_user, get_queue_count, get_center_listing, get_serving_token,
     get_walkin_serving_token, get_walkin_queue_count,
-    generate_token_number, calculate_wait_time,
+    generate_token_number, is_active_token_conflict, idempotency_key, calculate_wait_time, calculate_booking_times,
+    estimate_queue_wait, estimate_travel_time, get_traffic_multiplier, live_token_criteria,
     calculate_travel_time, get_user_location,
-    expire_old_tokens, recalculate_queue_times, send_timing_alert, IST
+    expire_old_tokens, send_timing_alert, IST
 )
+from queue_recalc import schedule_queue_recalculation, is_recalculation_pending
+from geo import center_geo_index
+from search import search_centers
+from center_cache import get_center
+from events import publish_queue_change
+from archive import history_page
+from passwords import hash_password
 from auth import user_required
+from replica import read_replica
 
 
 @user_bp.route('/services')
@@ -24,40 +34,55 @@ def services():
         pass
 
     category_filter = request.args.get('category')
+    rows = get_center_listing(category_filter, current_app.config.get('SERVICES_LISTING_CACHE_SECONDS', 5))
 
-    if category_filter:
-        centers = ServiceCenter.query.filter(ServiceCenter.category.contains(category_filter)).all()
-    else:
-        centers = ServiceCenter.query.all()
+    # Full-text search narrows the listing and orders it by relevance
+    search_query = request.args.get('q', '').strip()
+    if search_query:
+        ranks = dict(search_centers(search_query, limit=100))
+        rows = sorted((row for row in rows if row.id in ranks), key=lambda row: -ranks[row.id])
 
     active_token = get_active_token_for_user(session['user_id'])
 
-    center_data = []
-    for center in centers:
-        try:
-            queue_count = get_queue_count(center.id)
-        except:
-            queue_count = 0
+    # Optional distance ranking from the user's saved location
+    distances = {}
+    if request.args.get('sort') == 'distance':
+        user_lat, user_lon = get_user_location(User.query.get(session['user_id']))
+        if user_lat is not None and user_lon is not None:
+            distances = center_geo_index.distances(user_lat, user_lon, category_filter)
+        else:
+            flash('Save your location in your profile to sort centers by distance.', 'info')
 
+    center_data = []
+    for row in rows:
         center_data.append({
-            'center': center,
-            'queue_count': queue_count,
-            'can_request': queue_count < 15,
-            'is_new': center.id > 19
+            'center': row,
+            'queue_count': row.queue_count,
+            'can_request': row.queue_count < 15,
+            'is_new': row.id > 19,
+            'distance_km': distances.get(row.id)
         })
 
-    return render_template('user/services.html', centers=center_data, active_token=active_token)
+    if distances:
+        center_data.sort(key=lambda item: (item['distance_km'] is None, item['distance_km'] or 0))
+
+    return render_template('user/services.html', centers=center_data, active_token=active_token,
+                           booking_key=idempotency_key())
 
 
 @user_bp.route('/request_token/<int:center_id>')
 def request_token(center_id):
+    """Create a PendingPayment token; `key` makes retries return the same token"""
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
 
-    # Check if user already has active token
-    if get_active_token_for_user(session['user_id']):
-        flash('You already have an active token!', 'warning')
-        return redirect(url_for('user.services'))
+    user_id = session['user_id']
+    booking_key = request.args.get('key') or request.headers.get('Idempotency-Key')
+    if booking_key:
+        booking_key = idempotency_key(booking_key)
+        existing = Token.query.filter_by(user_id=user_id, booking_key=booking_key).first()
+        if existing:
+            return redirect(url_for('user.payment', token_id=existing.id))
 
     # Check queue limit
     if get_queue_count(center_id) >= 15:
@@ -67,13 +92,27 @@ def request_token(center_id):
     # Create token
     token_number = generate_token_number(center_id)
     token = Token(
-        user_id=session['user_id'],
+        user_id=user_id,
         service_center_id=center_id,
         token_number=token_number,
-        status='PendingPayment'
+        status='PendingPayment',
+        booking_key=booking_key
     )
     db.session.add(token)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if booking_key:
+            # A concurrent retry of this same request got there first
+            existing = Token.query.filter_by(user_id=user_id, booking_key=booking_key).first()
+            if existing:
+                return redirect(url_for('user.payment', token_id=existing.id))
+        # ux_tokens_user_active: the user already holds a live token
+        if not is_active_token_conflict(e):
+            raise
+        flash('You already have an active token!', 'warning')
+        return redirect(url_for('user.services'))
 
     return redirect(url_for('user.payment', token_id=token.id))
 
@@ -89,102 +128,89 @@ def payment(token_id):
         return redirect(url_for('user.services'))
 
     if request.method == 'POST':
-        user = User.query.get(session['user_id'])
-        center = ServiceCenter.query.get(token.service_center_id)
-        serving_token = get_serving_token(center.id)
+        # Claim the token for this payment request in one conditional UPDATE.
+        # A double submit or retry loses the claim and gets the original
+        # result without recomputing times, calling ORS or re-sending email.
+        # A claim left behind by a request that died mid-way (worker killed or
+        # timed out) expires, so the token doesn't stay stuck in PendingPayment.
+        payment_key = idempotency_key(request.form.get('idempotency_key') or request.headers.get('Idempotency-Key'))
+        now = get_ist_now()
+        abandoned_before = now - timedelta(seconds=current_app.config.get('PAYMENT_CLAIM_TIMEOUT_SECONDS', 150))
+        claimed = db.session.execute(
+            db.update(Token).where(
+                Token.id == token.id,
+                Token.status == 'PendingPayment',
+                db.or_(
+                    Token.payment_key.is_(None),
+                    Token.payment_claimed_time.is_(None),
+                    Token.payment_claimed_time < abandoned_before
+                )
+            ).values(payment_key=payment_key, payment_claimed_time=now).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            db.session.refresh(token)
+            if token.status == 'PendingPayment':
+                flash('Your payment is being processed.', 'info')
+            return redirect(url_for('user.queue_status', token_id=token.id))
 
-        # Calculate position
-        position = Token.query.filter(
-            Token.service_center_id == center.id,
-            Token.status == 'Active',
-            Token.is_walkin == False,
-            Token.id < token.id
-        ).count() + 1
-        if serving_token:
-            position += 1
+        try:
+            user = User.query.get(session['user_id'])
+            center = get_center(token.service_center_id)
+
+            user_lat, user_lon = get_user_location(user)
+            user_email, user_name = user.email, user.name
+            center_id, token_number = token.service_center_id, token.token_number
+            # Hand the pooled connection back before the ORS round trip (up to 15 s), so slow
+            # provider calls don't pin database connections under threaded/gevent workers
+            db.session.commit()
 
-        # Calculate travel time
-        user_lat, user_lon = get_user_location(user)
-        travel_time = calculate_travel_time(user_lat, user_lon, center.latitude, center.longitude)
+            # Calculate travel time
+            travel_time = calculate_travel_time(user_lat, user_lon, center.latitude, center.longitude)
 
-        if travel_time is None:
-            travel_time = 30  # Default fallback: 30 min when ORS API unavailable or coords missing
+            if travel_time is None:
+                travel_time = 30  # Default fallback: 30 min when ORS API unavailable or coords missing
 
-        # Calculate and STORE fixed times
-        if position <= 1:
-            # First person: Ready time (10 min) + Travel time
-            leave_time = get_ist_now() + timedelta(minutes=10)
-            reach_time = leave_time + timedelta(minutes=travel_time)
-        else:
-            # Find previous person's service end time
-            previous_tokens = Token.query.filter(
-                Token.service_center_id == center.id,
-                Token.status.in_(['Active', 'Serving']),
-                Token.is_walkin == False,
-                Token.id < token.id
-            ).order_by(Token.id).all()
-
-            if previous_tokens:
-                # Start from first person
-                first_token = previous_tokens[0]
-                first_user = User.query.get(first_token.user_id)
-                first_user_lat, first_user_lon = get_user_location(first_user)
-                first_travel = calculate_travel_time(first_user_lat, first_user_lon, center.latitude, center.longitude)
-                if first_travel is None:
-                    first_travel = 30  # Default fallback
-
-                # First person's arrival time
-                first_leave = first_token.created_time + timedelta(minutes=10)
-                first_arrival = first_leave + timedelta(minutes=first_travel)
-                service_end_time = first_arrival + timedelta(minutes=center.avg_service_time)
-
-                # Calculate for each person in between
-                for prev_token in previous_tokens[1:]:
-                    service_end_time = service_end_time + timedelta(minutes=center.avg_service_time)
-
-                # Current person's earliest possible arrival
-                earliest_leave = get_ist_now() + timedelta(minutes=10)
-                earliest_arrival = earliest_leave + timedelta(minutes=travel_time)
-
-                # Reach time = max(counter free time, earliest arrival time)
-                reach_time = max(service_end_time, earliest_arrival)
-                leave_time = reach_time - timedelta(minutes=travel_time)
-
-                # If leave time is in past, adjust
-                if leave_time < get_ist_now():
-                    leave_time = get_ist_now()
-                    reach_time = leave_time + timedelta(minutes=travel_time)
-            else:
-                # Fallback
-                leave_time = get_ist_now() + timedelta(minutes=10)
-                reach_time = leave_time + timedelta(minutes=travel_time)
-
-        # Store times in database
-        token.status = 'Active'
-        token.leave_time = leave_time
-        token.reach_time = reach_time
-        token.estimated_service_start = reach_time
-        token.estimated_service_end = reach_time + timedelta(minutes=center.avg_service_time)
-        db.session.commit()
+            # Calculate and STORE fixed times, chained off the previous token's stored end time
+            leave_time, reach_time = calculate_booking_times(center, token, travel_time)
+
+            # Store times in database
+            token.status = 'Active'
+            token.leave_time = leave_time
+            token.reach_time = reach_time
+            token.estimated_service_start = reach_time
+            token.estimated_service_end = reach_time + timedelta(minutes=center.avg_service_time)
+            db.session.commit()
+        except Exception:
+            # Release the claim so the customer can retry the payment
+            db.session.rollback()
+            db.session.execute(
+                db.update(Token).where(Token.id == token_id, Token.payment_key == payment_key)
+                .values(payment_key=None, payment_claimed_time=None).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            raise
+        publish_queue_change(center_id)
 
         flash('Payment successful! Your token is confirmed.', 'success')
 
-        # Send timing alert email (non-blocking)
+        # Send timing alert email (non-blocking); only plain values from here on, so the
+        # Brevo call doesn't reload expired ORM objects and hold a connection
         try:
-            if user.email:
-                email_sent = send_timing_alert(user.email, user.name, token.token_number, center.name, leave_time, reach_time)
+            if user_email:
+                email_sent = send_timing_alert(user_email, user_name, token_number, center.name, leave_time, reach_time)
                 if email_sent:
-                    print(f"✅ Email sent to {user.email} for token {token.token_number} at {center.name}")
+                    print(f"✅ Email sent to {user_email} for token {token_number} at {center.name}")
                 else:
-                    print(f"⚠️ Email failed for {user.email} for token {token.token_number} at {center.name}")
+                    print(f"⚠️ Email failed for {user_email} for token {token_number} at {center.name}")
             else:
-                print(f"⚠️ No email address for user {user.name} (token {token.token_number} at {center.name})")
+                print(f"⚠️ No email address for user {user_name} (token {token_number} at {center.name})")
         except Exception as e:
-            print(f"❌ Email sending error for token {token.token_number} at {center.name}: {e}")
+            print(f"❌ Email sending error for token {token_number} at {center.name}: {e}")
 
-        return redirect(url_for('user.queue_status', token_id=token.id))
+        return redirect(url_for('user.queue_status', token_id=token_id))
 
-    return render_template('user/payment.html', token=token)
+    return render_template('user/payment.html', token=token, payment_key=idempotency_key())
 
 
 @user_bp.route('/queue_status/<int:token_id>')
@@ -212,7 +238,8 @@ def queue_status(token_id):
             Token.service_center_id == token.service_center_id,
             Token.status == 'Active',
             Token.is_walkin == False,
-            Token.id < token.id
+            Token.id < token.id,
+            *live_token_criteria()
         ).count() + 1
         if serving_token:
             position += 1
@@ -238,6 +265,7 @@ def queue_status(token_id):
                            travel_time=travel_time,
                            leave_time=leave_time,
                            reach_counter_time=reach_counter_time,
+                           times_updating=is_recalculation_pending(token.service_center_id),
                            IST=IST)
 
 
@@ -257,9 +285,10 @@ def cancel_token(token_id):
         token.no_show_reason = 'Cancelled by user'
         token.no_show_time = get_ist_now()
         db.session.commit()
+        publish_queue_change(center_id)
 
         # Recalculate queue times for remaining tokens
-        recalculate_queue_times(center_id)
+        schedule_queue_recalculation(center_id, token.id)
 
         flash('Token cancelled successfully.', 'info')
 
@@ -267,13 +296,16 @@ def cancel_token(token_id):
 
 
 @user_bp.route('/history')
+@read_replica()
 def user_history():
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
 
-    tokens = Token.query.filter_by(user_id=session['user_id']).filter(
-        Token.status.in_(['Completed', 'Expired'])
-    ).order_by(Token.created_time.desc()).limit(50).all()
+    user_id = session['user_id']
+    tokens, next_cursor = history_page(
+        lambda model: [model.user_id == user_id, model.status.in_(['Completed', 'Expired'])],
+        cursor=request.args.get('before'), per_page=50
+    )
 
     # Convert times to IST for display
     enriched_tokens = []
@@ -307,7 +339,7 @@ def user_history():
 
         enriched_tokens.append(token_data)
 
-    return render_template('user/user_history.html', tokens=enriched_tokens, IST=IST)
+    return render_template('user/user_history.html', tokens=enriched_tokens, next_cursor=next_cursor, IST=IST)
 
 
 @user_bp.route('/profile', methods=['GET', 'POST'])
@@ -349,20 +381,149 @@ def service_detail(center_id):
     if 'user_id' in session:
         active_token = get_active_token_for_user(session['user_id'])
 
-    # Get related centers (same category)
-    related_centers = ServiceCenter.query.filter(
-        ServiceCenter.category == center.category,
-        ServiceCenter.id != center.id
-    ).limit(3).all()
+    # Get related centers (same category, nearest first when the center has coordinates)
+    related_centers = []
+    if center.latitude is not None and center.longitude is not None:
+        nearest_ids = [center_id for center_id, _ in
+                       center_geo_index.nearest(center.latitude, center.longitude, 4, center.category)
+                       if center_id != center.id][:3]
+        related_by_id = {c.id: c for c in ServiceCenter.query.filter(ServiceCenter.id.in_(nearest_ids)).all()}
+        related_centers = [related_by_id[center_id] for center_id in nearest_ids if center_id in related_by_id]
+    if not related_centers:
+        related_centers = ServiceCenter.query.filter(
+            ServiceCenter.category == center.category,
+            ServiceCenter.id != center.id
+        ).limit(3).all()
 
     return render_template('user/service_details.html',
                            center=center,
+                           booking_key=idempotency_key(),
                            queue_count=queue_count,
                            serving_token=serving_token,
                            active_token=active_token,
                            related_centers=related_centers)
 
 
+@user_bp.route('/centers/search')
+def search_centers_api():
+    """JSON full-text search over center name, category, location, description, services and facilities"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'centers': []})
+
+    try:
+        matches = search_centers(query, limit=min(request.args.get('limit', 20, type=int), 100))
+        centers = {c.id: c for c in db.session.query(
+            ServiceCenter.id, ServiceCenter.name, ServiceCenter.category, ServiceCenter.location
+        ).filter(ServiceCenter.id.in_([center_id for center_id, _ in matches])).all()}
+
+        return jsonify({'centers': [
+            {
+                'id': center_id,
+                'name': centers[center_id].name,
+                'category': centers[center_id].category,
+                'location': centers[center_id].location,
+                'rank': rank
+            }
+            for center_id, rank in matches if center_id in centers
+        ]})
+    except Exception as e:
+        print(f"❌ Center search error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@user_bp.route('/centers/nearby')
+@user_required
+def nearby_centers():
+    """JSON list of the nearest centers to a point (defaults to the user's saved location)"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            lat, lon = get_user_location(User.query.get(session['user_id']))
+        if lat is None or lon is None:
+            return jsonify({'error': 'Location required: pass lat/lon or save it in your profile'}), 400
+
+        category = request.args.get('category')
+        radius_km = request.args.get('radius_km', type=float)
+        k = min(request.args.get('k', 10, type=int), 100)
+
+        if radius_km:
+            matches = center_geo_index.within_radius(lat, lon, radius_km, category)[:k]
+        else:
+            matches = center_geo_index.nearest(lat, lon, k, category)
+
+        centers = {c.id: c for c in db.session.query(
+            ServiceCenter.id, ServiceCenter.name, ServiceCenter.category, ServiceCenter.location
+        ).filter(ServiceCenter.id.in_([center_id for center_id, _ in matches])).all()}
+
+        return jsonify({'centers': [
+            {
+                'id': center_id,
+                'name': centers[center_id].name,
+                'category': centers[center_id].category,
+                'location': centers[center_id].location,
+                'distance_km': round(distance, 2)
+            }
+            for center_id, distance in matches if center_id in centers
+        ]})
+    except Exception as e:
+        print(f"❌ Nearby centers error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@user_bp.route('/centers/recommend')
+@user_required
+def recommend_centers():
+    """Rank nearby centers of a category by estimated time until the user is served
+
+    Scored in one plain-Python pass rather than with numpy: candidates are
+    bounded by radius_km, their distances come from the geo index's single
+    pass, and each score is a few additions on the cached listing row.
+    benchmarks/bench_geo.py times this endpoint.
+    """
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            lat, lon = get_user_location(User.query.get(session['user_id']))
+        if lat is None or lon is None:
+            return jsonify({'error': 'Location required: pass lat/lon or save it in your profile'}), 400
+
+        category = request.args.get('category')
+        radius_km = min(request.args.get('radius_km', 10, type=float), 100)
+        distances = dict(center_geo_index.within_radius(lat, lon, radius_km, category))
+
+        # Queue counts for every candidate come from the cached listing query
+        rows = [row for row in get_center_listing(category, current_app.config.get('SERVICES_LISTING_CACHE_SECONDS', 5))
+                if row.id in distances]
+
+        # Ready time (10 min) + travel vs. queue wait: whichever ends later decides when service starts
+        traffic_multiplier = get_traffic_multiplier()
+        ranked = []
+        for row in rows:
+            travel_minutes = estimate_travel_time(distances[row.id], traffic_multiplier)
+            wait_minutes = estimate_queue_wait(row.queue_count, row.serving_count, row.avg_service_time)
+            ranked.append({
+                'id': row.id,
+                'name': row.name,
+                'category': row.category,
+                'location': row.location,
+                'distance_km': round(distances[row.id], 2),
+                'queue_count': row.queue_count,
+                'travel_minutes': travel_minutes,
+                'wait_minutes': wait_minutes,
+                'effective_minutes': max(10 + travel_minutes, wait_minutes),
+                'can_request': row.queue_count < 15
+            })
+        ranked.sort(key=lambda item: (not item['can_request'], item['effective_minutes'], item['distance_km']))
+
+        return jsonify({'centers': ranked[:min(request.args.get('k', 10, type=int), 50)]})
+    except Exception as e:
+        print(f"❌ Center recommendation error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
 @user_bp.route('/track', methods=['GET', 'POST'])
 def track_token():
     if request.method == 'POST':
@@ -385,7 +546,6 @@ def track_token():
 @user_bp.route('/track/<token_number>')
 def track_status(token_number):
     token = Token.query.filter_by(token_number=token_number).first_or_404()
-    center = ServiceCenter.query.get(token.service_center_id)
 
     if token.is_walkin:
         serving_token = get_walkin_serving_token(token.service_center_id)
@@ -395,7 +555,8 @@ def track_status(token_number):
                 Token.service_center_id == token.service_center_id,
                 Token.status == 'Active',
                 Token.is_walkin == True,
-                Token.id < token.id
+                Token.id < token.id,
+                *live_token_criteria()
             ).count() + 1
             if serving_token:
                 position += 1
@@ -407,7 +568,8 @@ def track_status(token_number):
                 Token.service_center_id == token.service_center_id,
                 Token.status == 'Active',
                 Token.is_walkin == False,
-                Token.id < token.id
+                Token.id < token.id,
+                *live_token_criteria()
             ).count() + 1
             if serving_token:
                 position += 1
@@ -431,7 +593,6 @@ def track_status(token_number):
 @user_bp.route('/register-center', methods=['GET', 'POST'])
 def register_center():
     try:
-        from werkzeug.security import generate_password_hash as _hash
         from models import ServiceCenterRegistration
         if request.method == 'POST':
             phone = request.form.get('phone')
@@ -453,7 +614,7 @@ def register_center():
                 owner_name=request.form.get('owner_name'),
                 email=request.form.get('email'),
                 phone=phone,
-                password=_hash(password),
+                password=hash_password(password),
                 alternate_phone=request.form.get('alternate_phone'),
                 city=request.form.get('city'),
                 state=request.form.get('state'),
@@ -0,0 +1,255 @@
+"""Shared cache layer with pluggable backends
+
+CACHE_URL selects the backend:
+
+    local://?maxsize=2048            in-process LRU (default, per worker)
+    sqlite:////tmp/queueflow-cache.db  file shared by every worker on one box
+    redis://host:6379/0              Redis (needs the optional `redis` package)
+
+Keys live in namespaces whose version number is part of the stored key, so
+invalidate(namespace) drops a whole namespace in one write. On shared
+backends that is seen by every worker; Redis additionally publishes the
+invalidation so subscribers can drop derived in-process state.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+from flask import current_app
+
+INVALIDATION_CHANNEL = 'queueflow:invalidate'
+
+
+class BaseCache(ABC):
+    def __init__(self):
+        self._subscribers = []
+
+    # Backend primitives: get/set/delete/incr on raw string keys
+    @abstractmethod
+    def get(self, key):
+        """The value stored at key, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """Store any picklable value, expiring after ttl seconds if given"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove key if present"""
+
+    @abstractmethod
+    def incr(self, key):
+        """Atomically add 1 to an integer counter (0 if missing, never expires); returns the new value"""
+
+    # Versioned namespaces
+    def _namespace_version(self, namespace):
+        return self.get(f'{namespace}:__version__') or 0
+
+    def versioned_key(self, namespace, key):
+        return f'{namespace}:v{self._namespace_version(namespace)}:{key}'
+
+    def ns_get(self, namespace, key):
+        return self.get(self.versioned_key(namespace, key))
+
+    def ns_set(self, namespace, key, value, ttl=None):
+        self.set(self.versioned_key(namespace, key), value, ttl)
+
+    def ns_delete(self, namespace, key):
+        self.delete(self.versioned_key(namespace, key))
+
+    def invalidate(self, namespace):
+        """Drop every key in a namespace and notify subscribers"""
+        self.incr(f'{namespace}:__version__')
+        self.publish(namespace)
+
+    # Invalidation fan-out; in-process by default
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, namespace):
+        self._notify(namespace)
+
+    def _notify(self, namespace):
+        for callback in list(self._subscribers):
+            try:
+                callback(namespace)
+            except Exception as e:
+                print(f"❌ Cache invalidation subscriber error: {e}")
+
+
+class LocalCache(BaseCache):
+    """Thread-safe in-process LRU with per-key TTL"""
+
+    def __init__(self, maxsize=2048):
+        super().__init__()
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._versions = {}  # Namespace versions are never evicted
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._versions:
+                return self._versions[key]
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._versions.get(key, 0) + 1
+            self._versions[key] = value
+            return value
+
+
+class SQLiteCache(BaseCache):
+    """Cache in a local SQLite file shared by all worker processes on one machine"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), time.time() + ttl if ttl else None)
+        )
+        self._local.writes = getattr(self._local, 'writes', 0) + 1
+        if self._local.writes % 500 == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + 1
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)",
+                         (key, pickle.dumps(value)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+
+class RedisCache(BaseCache):
+    """Redis-protocol backend; invalidations are also published over pub/sub"""
+
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL uses redis:// but the 'redis' package is not installed")
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def get(self, key):
+        value = self._redis.get(key)
+        if value is None:
+            return None
+        if key.endswith(':__version__'):
+            return int(value)
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, pickle.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+    def publish(self, namespace):
+        self._redis.publish(INVALIDATION_CHANNEL, namespace)
+
+    def subscribe(self, callback):
+        super().subscribe(callback)
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(INVALIDATION_CHANNEL)
+        for message in pubsub.listen():
+            data = message.get('data')
+            self._notify(data.decode() if isinstance(data, bytes) else data)
+
+
+def create_cache(url):
+    parsed = urlparse(url or 'local://')
+    if parsed.scheme == 'local':
+        maxsize = int(parse_qs(parsed.query).get('maxsize', ['2048'])[0])
+        return LocalCache(maxsize=maxsize)
+    if parsed.scheme == 'sqlite':
+        return SQLiteCache(url[len('sqlite:///'):])
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {parsed.scheme}")
+
+
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The app's shared cache, created from CACHE_URL on first use"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get('queueflow_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = app.extensions.get('queueflow_cache')
+            if cache is None:
+                cache = app.extensions['queueflow_cache'] = create_cache(app.config.get('CACHE_URL'))
+    return cache
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import event
+
+from cache import get_cache
+from extensions import db
+from models import ServiceCenter
+from replica import on_primary
+
+CenterInfo = namedtuple('CenterInfo', [column.key for column in ServiceCenter.__table__.columns])
+
+CACHE_NAMESPACE = 'center'
+
+_stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'invalidations': 0}
+_lock = threading.Lock()
+
+
+def _load(center_id):
+    # Entries are shared across requests, so never fill them from a lagging replica
+    with on_primary():
+        center = db.session.get(ServiceCenter, center_id)
+    if center is None:
+        return None
+    return CenterInfo(*(getattr(center, key) for key in CenterInfo._fields))
+
+
+def get_center(center_id):
+    """Read-through cached, read-only snapshot of a service center (or None)
+
+    Use this wherever a route only reads center fields; load the ORM object
+    when the center is being edited. When CENTER_CACHE_REVALIDATE_SECONDS is
+    set, entries older than that are checked against the center's version
+    column so edits made by other workers are picked up even on a
+    per-process cache backend.
+    """
+    cache = get_cache()
+    revalidate_after = current_app.config.get('CENTER_CACHE_REVALIDATE_SECONDS')
+    entry = cache.ns_get(CACHE_NAMESPACE, center_id)
+
+    if entry is not None:
+        info, checked_at = entry
+        if revalidate_after is None or time.time() - checked_at < revalidate_after:
+            with _lock:
+                _stats['hits'] += 1
+            return info
+
+        with on_primary():
+            current_version = db.session.query(ServiceCenter.version).filter(ServiceCenter.id == center_id).scalar()
+        with _lock:
+            _stats['revalidations'] += 1
+        if current_version == info.version:
+            cache.ns_set(CACHE_NAMESPACE, center_id, (info, time.time()))
+            with _lock:
+                _stats['hits'] += 1
+            return info
+
+    with _lock:
+        _stats['misses'] += 1
+    info = _load(center_id)
+    if info is None:
+        cache.ns_delete(CACHE_NAMESPACE, center_id)
+    else:
+        cache.ns_set(CACHE_NAMESPACE, center_id, (info, time.time()))
+    return info
+
+
+def invalidate_center(center_id=None):
+    """Drop one center (or every center) from the cache"""
+    with _lock:
+        _stats['invalidations'] += 1
+    if center_id is None:
+        get_cache().invalidate(CACHE_NAMESPACE)
+    else:
+        get_cache().ns_delete(CACHE_NAMESPACE, center_id)
+
+
+def center_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+@event.listens_for(ServiceCenter, 'before_update')
+def _bump_center_version(mapper, connection, target):
+    target.version = (target.version or 0) + 1
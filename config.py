@@ -8,6 +8,18 @@ class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica for @read_replica views (analytics, history, exports)
+    SQLALCHEMY_BINDS = {'replica': os.environ['REPLICA_DATABASE_URL']} if os.environ.get('REPLICA_DATABASE_URL') else {}
+    REPLICA_MAX_STALENESS_SECONDS = float(os.environ.get('REPLICA_MAX_STALENESS_SECONDS', 10))
+    REPLICA_LAG_CHECK_SECONDS = 2
+    
+    # SQLite profile for several gunicorn workers on one file (sqlite_profile.py); {} for SQLite defaults
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+        'mmap_size': 256 * 1024 * 1024,
+    }
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
@@ -26,9 +38,20 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     
+    # Shared cache: local://, sqlite:////path/to/cache.db or redis://host:6379/0
+    CACHE_URL = os.environ.get('CACHE_URL') or 'local://'
+    
+    # Password hashing (werkzeug method string); outdated hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    
     # Rate Limiting
     RATELIMIT_STORAGE_URL = "memory://"
     
+    # Compiled templates shared across processes and restarts (jinja_cache.py); '' disables
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache')
+    )
+    
     # File Upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
@@ -36,6 +59,29 @@ class Config:
     MAX_QUEUE_SIZE = 15
     TOKEN_EXPIRY_HOURS = 2
     MIN_CALL_INTERVAL_MINUTES = 5
+    # A payment claim older than this belongs to a request that died (gunicorn kills at 120 s)
+    # and may be taken over by a retry
+    PAYMENT_CLAIM_TIMEOUT_SECONDS = 150
+    QUEUE_RECALC_ASYNC = True  # Coalesce cancel/no-show recalculations on a background worker
+    QUEUE_RECALC_DEBOUNCE_SECONDS = 2
+    SERVICES_LISTING_CACHE_SECONDS = 5
+    CENTER_CACHE_REVALIDATE_SECONDS = 30  # None: trust cached centers until invalidated
+    TOKEN_ARCHIVE_AFTER_DAYS = int(os.environ.get('TOKEN_ARCHIVE_AFTER_DAYS', 90))  # flask admin archive-tokens
+    TOKEN_ARCHIVE_BATCH_SIZE = 500
+    MIGRATION_LOCK_TIMEOUT = '5s'  # flask admin migrate: DDL gives up rather than queue behind live traffic
+    MIGRATION_BATCH_SIZE = 1000
+    MIGRATION_BATCH_PAUSE_SECONDS = 0.1
+    # Monthly partitions of tokens on PostgreSQL (flask admin partition-tokens); live-queue
+    # queries then only look back LIVE_TOKEN_MAX_AGE_HOURS so older partitions are pruned
+    TOKEN_PARTITIONING = os.environ.get('TOKEN_PARTITIONING', '').lower() in ('1', 'true', 'yes')
+    TOKEN_PARTITION_MONTHS_AHEAD = 3
+    LIVE_TOKEN_MAX_AGE_HOURS = 24
+    QUEUE_EVENTS_BUS_DIR = os.environ.get('QUEUE_EVENTS_BUS_DIR')  # SQLite event bus sockets; default under the temp dir
+    # Live /admin/queue-events stream: each open dashboard holds a worker thread for up to
+    # QUEUE_EVENTS_STREAM_SECONDS, so gunicorn.conf.py only turns it on for threaded/gevent
+    # workers; otherwise dashboards fall back to the conditional poll
+    QUEUE_EVENTS_STREAM = os.environ.get('QUEUE_EVENTS_STREAM', '').lower() in ('1', 'true', 'yes')
+    QUEUE_EVENTS_STREAM_SECONDS = 300
     
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -46,8 +92,10 @@ class ProductionConfig(Config):
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
-        'pool_size': 10,
-        'max_overflow': 20,
+        # gunicorn.conf.py sizes the pool to each worker's threads/greenlets
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 20),
+        'pool_timeout': 10,
     }
     
 config = {
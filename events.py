@@ -0,0 +1,160 @@
+"""Cross-process queue-change notifications
+
+publish_queue_change(center_id) announces that a center's queue changed.
+Every process runs one listener thread that receives those announcements
+and fans them out to its locally connected clients (see subscribe()).
+
+Transport depends on the database:
+
+    postgresql  NOTIFY on the 'queue_changes' channel, one LISTEN connection
+                per process; works across workers and across dynos
+    otherwise   a Unix datagram socket per process in QUEUE_EVENTS_BUS_DIR;
+                publishers send to every socket in the directory, which
+                covers all workers on one machine
+"""
+import json
+import os
+import queue
+import select
+import socket
+import tempfile
+import threading
+
+from flask import current_app
+
+from extensions import db
+from queue_version import get_queue_version
+
+CHANNEL = 'queue_changes'
+
+# center_id -> set of queue.Queue, one per connected client in this process
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _bus_dir(app):
+    return app.config.get('QUEUE_EVENTS_BUS_DIR') or os.path.join(tempfile.gettempdir(), 'queueflow-bus')
+
+
+def _dispatch(payload):
+    try:
+        event = json.loads(payload)
+    except (TypeError, ValueError):
+        return
+    with _subscribers_lock:
+        targets = list(_subscribers.get(event.get('center_id'), ()))
+    for q in targets:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass  # Slow client; it will catch up on the next event
+
+
+def publish_queue_change(center_id, kind='changed'):
+    """Tell every process that a center's queue changed (best effort)
+
+    Call after commit; the payload carries the committed queue_version so
+    clients can skip events they have already seen.
+    """
+    try:
+        payload = json.dumps({'center_id': center_id, 'kind': kind, 'version': get_queue_version(center_id)})
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.connect() as conn:
+                conn.execute(db.text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': payload})
+                conn.commit()
+            return
+
+        bus_dir = _bus_dir(current_app)
+        if not os.path.isdir(bus_dir):
+            _dispatch(payload)
+            return
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for name in os.listdir(bus_dir):
+                path = os.path.join(bus_dir, name)
+                try:
+                    sender.sendto(payload.encode(), path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Socket left behind by a process that has exited
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError as e:
+                    print(f"⚠️ Queue event send to {name} failed: {e}")
+        finally:
+            sender.close()
+    except Exception as e:
+        print(f"❌ Queue event publish error for center {center_id}: {e}")
+
+
+def subscribe(center_id, maxsize=100):
+    """Register a local client for a center's events; returns a queue.Queue"""
+    _ensure_listener(current_app._get_current_object())
+    q = queue.Queue(maxsize=maxsize)
+    with _subscribers_lock:
+        _subscribers.setdefault(center_id, set()).add(q)
+    return q
+
+
+def unsubscribe(center_id, q):
+    with _subscribers_lock:
+        clients = _subscribers.get(center_id)
+        if clients:
+            clients.discard(q)
+            if not clients:
+                del _subscribers[center_id]
+
+
+def _ensure_listener(app):
+    global _listener
+    with _listener_lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        with app.app_context():
+            target = _listen_postgres if db.engine.dialect.name == 'postgresql' else _listen_socket
+        _listener = threading.Thread(target=target, args=(app,), name='queue-events', daemon=True)
+        _listener.start()
+
+
+def _listen_postgres(app):
+    with app.app_context():
+        raw = db.engine.raw_connection()
+    raw.detach()  # Dedicated LISTEN session; never handed back to the pool
+    try:
+        conn = raw.driver_connection
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute(f"LISTEN {CHANNEL}")
+        while True:
+            if select.select([conn], [], [], 30) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                _dispatch(conn.notifies.pop(0).payload)
+    except Exception as e:
+        print(f"❌ Queue event listener stopped: {e}")
+    finally:
+        raw.close()
+
+
+def _listen_socket(app):
+    bus_dir = _bus_dir(app)
+    os.makedirs(bus_dir, exist_ok=True)
+    path = os.path.join(bus_dir, f'{os.getpid()}-{threading.get_ident()}.sock')
+    receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    receiver.bind(path)
+    try:
+        while True:
+            data = receiver.recv(4096)
+            _dispatch(data.decode())
+    except Exception as e:
+        print(f"❌ Queue event listener stopped: {e}")
+    finally:
+        receiver.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
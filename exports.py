@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from archive import token_history_union
+from extensions import db
+from models import User
+from utils import IST, ist_to_utc
+
+EXPORT_COLUMNS = [
+    'token_number', 'status', 'is_walkin', 'customer_name', 'customer_mobile',
+    'created_time', 'leave_time', 'reach_time', 'actual_service_start',
+    'actual_service_end', 'completed_time', 'no_show_time', 'no_show_reason',
+]
+_TIME_COLUMNS = {'created_time', 'leave_time', 'reach_time', 'actual_service_start',
+                 'actual_service_end', 'completed_time', 'no_show_time'}
+
+# Asia/Kolkata has had a fixed +05:30 offset since 1945, so timestamps can be
+# shifted by one constant interval instead of localizing every value via pytz.
+IST_OFFSET = IST.utcoffset(datetime(2000, 1, 1))
+_SQL_IST_DIALECTS = ('sqlite', 'postgresql')
+
+
+def _ist_iso(column, dialect):
+    """SQL for a UTC column as an IST ISO 8601 string; other dialects get the raw column"""
+    if dialect == 'sqlite':
+        # Stored as 'YYYY-MM-DD HH:MM:SS.ffffff'. datetime() would round the fraction,
+        # so shift the whole seconds and carry the fraction over as text
+        seconds = db.func.substr(column, 1, 19)
+        shifted = db.func.replace(db.func.datetime(seconds, '+5 hours', '+30 minutes', type_=db.String), ' ', 'T')
+        return (shifted + db.func.substr(column, 20, type_=db.String) + '+05:30').label(column.name)
+    if dialect == 'postgresql':
+        return (db.func.to_char(column + IST_OFFSET, 'YYYY-MM-DD"T"HH24:MI:SS.US', type_=db.String)
+                + '+05:30').label(column.name)
+    return column
+
+
+def parse_export_range(start, end):
+    """Turn inclusive IST 'YYYY-MM-DD' bounds into a half-open UTC range"""
+    start_day = datetime.strptime(start, '%Y-%m-%d')
+    end_day = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
+    return ist_to_utc(start_day), ist_to_utc(end_day)
+
+
+def iter_token_history(center_id, start_utc, end_utc, batch_size=1000):
+    """Yield lists of export rows (dicts, IST ISO strings) one batch at a time
+
+    Live and archived tokens are both included. Rows come from a server-side
+    cursor (stream_results/yield_per) so memory stays bounded by batch_size
+    regardless of the date range. On SQLite and PostgreSQL the database
+    shifts and formats the timestamps in the SELECT, so rows pass through
+    untouched; elsewhere each batch is converted here.
+    """
+    tokens = token_history_union(
+        'id', 'token_number', 'status', 'is_walkin', 'user_id',
+        'created_time', 'leave_time', 'reach_time',
+        'actual_service_start', 'actual_service_end',
+        'completed_time', 'no_show_time', 'no_show_reason',
+        'walkin_name', 'walkin_mobile',
+        where=lambda model: [
+            model.service_center_id == center_id,
+            model.created_time >= start_utc,
+            model.created_time < end_utc,
+        ]
+    )
+    dialect = db.engine.dialect.name
+    stmt = db.select(
+        tokens.c.token_number, tokens.c.status, tokens.c.is_walkin,
+        db.func.coalesce(tokens.c.walkin_name, User.name).label('customer_name'),
+        db.case((tokens.c.walkin_name.isnot(None), tokens.c.walkin_mobile), else_=User.mobile).label('customer_mobile'),
+        _ist_iso(tokens.c.created_time, dialect), _ist_iso(tokens.c.leave_time, dialect),
+        _ist_iso(tokens.c.reach_time, dialect), _ist_iso(tokens.c.actual_service_start, dialect),
+        _ist_iso(tokens.c.actual_service_end, dialect), _ist_iso(tokens.c.completed_time, dialect),
+        _ist_iso(tokens.c.no_show_time, dialect), tokens.c.no_show_reason,
+    ).join(User, tokens.c.user_id == User.id).order_by(
+        tokens.c.created_time, tokens.c.id
+    ).execution_options(stream_results=True, yield_per=batch_size)
+
+    result = db.session.execute(stmt)
+    for partition in result.partitions():
+        batch = [row._asdict() for row in partition]
+        if dialect in _SQL_IST_DIALECTS:
+            yield batch
+            continue
+        for column in _TIME_COLUMNS:
+            for row in batch:
+                value = row[column]
+                row[column] = (value + IST_OFFSET).isoformat(timespec='microseconds') + '+05:30' if value else None
+        yield batch
+
+
+def generate_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def generate_ndjson(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in batch)
+
+
+EXPORT_FORMATS = {
+    'csv': (generate_csv, 'text/csv'),
+    'ndjson': (generate_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,151 @@
+import math
+import threading
+import time
+
+from sqlalchemy import event
+
+from extensions import db
+from models import ServiceCenter
+
+EARTH_RADIUS_KM = 6371.0
+CELL_DEGREES = 0.1  # ~11 km grid cells
+REBUILD_AFTER_SECONDS = 300  # Picks up center edits made by other workers
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _cell(lat, lon):
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lon / CELL_DEGREES))
+
+
+def _unit_vector(lat, lon):
+    """Point on the unit sphere for a latitude/longitude in degrees"""
+    phi, lmb = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lmb), math.cos(phi) * math.sin(lmb), math.sin(phi)
+
+
+def _distances_km(lat, lon, points):
+    """haversine_km from (lat, lon) to each unit vector in points, in one pass
+
+    The index stores each center's unit vector, computed once when it is
+    built. The great-circle distance follows from the straight-line chord
+    between two unit vectors, so each distance costs a square root and an
+    arcsine and no trigonometry on the center's coordinates.
+    """
+    x0, y0, z0 = _unit_vector(lat, lon)
+    sqrt, asin = math.sqrt, math.asin
+    return [
+        2 * EARTH_RADIUS_KM * asin(min(1.0, 0.5 * sqrt((x - x0) * (x - x0) + (y - y0) * (y - y0) + (z - z0) * (z - z0))))
+        for x, y, z in points
+    ]
+
+
+class CenterGeoIndex:
+    """In-memory grid index of service center coordinates
+
+    Centers are bucketed into fixed-size lat/lon cells. Radius queries only
+    scan the cells overlapping the query's bounding box and rank those
+    candidates by haversine distance in one pass.
+
+    Distances are computed in plain Python rather than with numpy, which is
+    not a dependency and would add to every worker's start-up. Each center's
+    unit vector is precomputed at build time and the grid keeps candidate
+    lists short: with 10k centers a radius or nearest query takes about a
+    millisecond, and ranking all of them about 10 ms. See
+    benchmarks/bench_geo.py.
+    """
+
+    def __init__(self):
+        self._cells = {}
+        self._flat = ([], [])  # (entries, their unit vectors), swapped together
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._built_at = None
+
+    def _ensure_built(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < REBUILD_AFTER_SECONDS:
+            return
+        rows = db.session.query(
+            ServiceCenter.id, ServiceCenter.category, ServiceCenter.latitude, ServiceCenter.longitude
+        ).filter(
+            ServiceCenter.latitude.isnot(None),
+            ServiceCenter.longitude.isnot(None)
+        ).all()
+        # (center_id, category, unit vector); full scans read the flat list
+        entries = [(center_id, category or '', _unit_vector(lat, lon)) for center_id, category, lat, lon in rows]
+        cells = {}
+        for entry, (_, _, lat, lon) in zip(entries, rows):
+            cells.setdefault(_cell(lat, lon), []).append(entry)
+        with self._lock:
+            self._cells = cells
+            self._flat = (entries, [entry[2] for entry in entries])
+            self._built_at = time.monotonic()
+
+    def within_radius(self, lat, lon, radius_km, category=None):
+        """[(center_id, distance_km)] within radius_km, nearest first"""
+        self._ensure_built()
+        dlat = radius_km / 111.0
+        dlon = radius_km / max(111.0 * math.cos(math.radians(lat)), 1e-6)
+        lat_lo, lon_lo = _cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = _cell(lat + dlat, lon + dlon)
+
+        cells = self._cells
+        candidates = [
+            entry
+            for i in range(lat_lo, lat_hi + 1)
+            for j in range(lon_lo, lon_hi + 1)
+            for entry in cells.get((i, j), ())
+            if not category or category in entry[1]
+        ]
+        ranked = [
+            (entry[0], distance)
+            for entry, distance in zip(candidates, _distances_km(lat, lon, [entry[2] for entry in candidates]))
+            if distance <= radius_km
+        ]
+        return sorted(ranked, key=lambda r: r[1])
+
+    def nearest(self, lat, lon, k=10, category=None, max_radius_km=500):
+        """[(center_id, distance_km)] for the k nearest centers, widening the search as needed
+
+        The grid search doubles its radius up to max_radius_km; past that the
+        bounding box spans so many cells that ranking every center is cheaper,
+        so sparse results fall back to a full scan and still return k centers.
+        """
+        radius = 5.0
+        while True:
+            found = self.within_radius(lat, lon, radius, category)
+            if len(found) >= k or len(found) >= len(self._flat[0]):
+                return found[:k]
+            if radius >= max_radius_km:
+                break
+            radius = min(radius * 2, max_radius_km)
+        ranked = sorted(self.distances(lat, lon, category).items(), key=lambda r: r[1])
+        return ranked[:k]
+
+    def distances(self, lat, lon, category=None):
+        """{center_id: distance_km} for every indexed center"""
+        self._ensure_built()
+        entries, points = self._flat
+        if category:
+            entries = [entry for entry in entries if category in entry[1]]
+            points = [entry[2] for entry in entries]
+        return dict(zip([entry[0] for entry in entries], _distances_km(lat, lon, points)))
+
+
+center_geo_index = CenterGeoIndex()
+
+
+@event.listens_for(ServiceCenter, 'after_insert')
+@event.listens_for(ServiceCenter, 'after_update')
+@event.listens_for(ServiceCenter, 'after_delete')
+def _invalidate_geo_index(mapper, connection, target):
+    center_geo_index.invalidate()
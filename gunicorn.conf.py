@@ -0,0 +1,62 @@
+"""Gunicorn settings: `gunicorn run:app -c gunicorn.conf.py`
+
+Views spend most of their time waiting on the database, OpenRouteService
+(up to 15 s) and Brevo (up to 10 s), so each worker serves several requests
+at once instead of gunicorn's default of one:
+
+  gthread (default)  - GUNICORN_THREADS threads per worker
+  gevent             - up to GUNICORN_WORKER_CONNECTIONS greenlets per worker;
+                       needs `pip install gevent psycogreen` (psycogreen makes
+                       psycopg2 yield while PostgreSQL answers)
+
+Every open /admin/queue-events stream holds a thread (or greenlet) for up
+to QUEUE_EVENTS_STREAM_SECONDS before the browser reconnects, so
+deployments with many admin screens should prefer gevent or raise
+GUNICORN_THREADS. QUEUE_EVENTS_STREAM is switched off for single-threaded
+workers, whose dashboards poll instead.
+
+Each concurrent request may hold one pooled database connection, so
+DB_POOL_SIZE defaults to the per-worker concurrency plus one for the queue
+recalculation thread; the PostgreSQL server must allow
+WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+
+Environment: PORT, WEB_CONCURRENCY (workers, default 2), GUNICORN_WORKER_CLASS,
+GUNICORN_THREADS (default 16), GUNICORN_WORKER_CONNECTIONS (default 100),
+DB_POOL_SIZE, DB_MAX_OVERFLOW, QUEUE_EVENTS_STREAM.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Greenlets mostly wait on providers, not the database: cap the pool rather
+# than open one connection per possible greenlet
+DB_POOL_MAX = 20
+
+if worker_class == 'gthread' or (worker_class == 'sync' and threads > 1):
+    # gunicorn runs sync workers with threads > 1 as gthread
+    _concurrency = threads
+elif worker_class == 'gevent':
+    _concurrency = min(worker_connections, DB_POOL_MAX)
+else:
+    _concurrency = 1
+os.environ.setdefault('DB_POOL_SIZE', str(_concurrency + 1))
+# Dashboard event streams would pin a single-threaded worker; those poll instead
+os.environ.setdefault('QUEUE_EVENTS_STREAM', '1' if _concurrency > 1 else '0')
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen is not installed: PostgreSQL queries will block the whole gevent worker")
+        return
+    patch_psycopg()
@@ -0,0 +1,41 @@
+"""Persistent Jinja bytecode cache, so a fresh worker skips template compilation
+
+Flask compiles each template the first time it is rendered, in every new
+process. With JINJA_BYTECODE_CACHE_DIR set (config.py defaults it to
+.jinja_cache/ in the project) compiled templates are written there and
+later processes load them instead. Fill it at build time so even the first
+request after a deploy or a dyno wake-up finds them:
+
+    flask --app run admin precompile-templates
+
+Entries are keyed by template source checksum, so an edited template is
+simply recompiled. See benchmarks/bench_cold_start.py for the effect.
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def configure_bytecode_cache(app):
+    """Attach a FileSystemBytecodeCache in JINJA_BYTECODE_CACHE_DIR if it is writable"""
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"⚠️ Jinja bytecode cache disabled: {e}")
+        return
+    if not os.access(directory, os.W_OK):
+        # Jinja raises on a failed write, which would break rendering
+        print(f"⚠️ Jinja bytecode cache disabled: {directory} is not writable")
+        return
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile_templates(app):
+    """Compile every HTML template into the bytecode cache; returns their names"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
@@ -0,0 +1,510 @@
+"""Versioned online schema migrations
+
+MIGRATIONS is an ordered list of versions, each a list of idempotent steps.
+Applied versions are recorded in schema_migrations, so every deploy runs
+only what is new:
+
+    flask admin migrate --dry-run     # plan and pre-flight checks, changes nothing
+    flask admin migrate               # apply pending versions
+
+Steps are written not to stall live queues: on PostgreSQL indexes are built
+with CREATE INDEX CONCURRENTLY, DDL gives up after MIGRATION_LOCK_TIMEOUT
+instead of queueing behind long transactions (and blocking everyone behind
+it), and backfills update MIGRATION_BATCH_SIZE rows per transaction with
+MIGRATION_BATCH_PAUSE_SECONDS between batches.
+
+Add a version at the end of MIGRATIONS; never edit or reorder applied ones.
+"""
+import time
+
+from flask import current_app
+
+from extensions import db
+from models import ACTIVE_TOKEN_PREDICATE
+from search import ensure_search_index
+from utils import WALKIN_GUEST_EMAIL, WALKIN_GUEST_MOBILE, get_ist_now
+
+# Kept out of db.metadata so create_all() never makes it: only the runner records versions
+_metadata = db.MetaData()
+schema_migrations = db.Table(
+    'schema_migrations', _metadata,
+    db.Column('version', db.String(100), primary_key=True),
+    db.Column('description', db.String(200)),
+    db.Column('applied_time', db.DateTime)
+)
+
+
+def _config(key, default):
+    value = current_app.config.get(key)
+    return default if value is None else value
+
+
+def _columns(conn, table):
+    """Column names of a table, or None if it does not exist yet"""
+    inspector = db.inspect(conn)
+    if not inspector.has_table(table):
+        return None
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def _partitions(conn, table):
+    """Partition names of a partitioned PostgreSQL table, else None"""
+    if conn.dialect.name != 'postgresql':
+        return None
+    partitioned = conn.execute(db.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+    ), {'table': table}).first()
+    if not partitioned:
+        return None
+    return conn.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table ORDER BY c.relname"
+    ), {'table': table}).scalars().all()
+
+
+def _ddl(conn):
+    """Begin a DDL transaction that fails fast rather than waiting on table locks"""
+    trans = conn.begin()
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text(f"SET LOCAL lock_timeout = '{_config('MIGRATION_LOCK_TIMEOUT', '5s')}'"))
+    return trans
+
+
+class CreateTables:
+    """Create missing tables from the models, with their indexes (empty, so no locking concern)"""
+
+    def describe(self):
+        return 'create missing tables from models'
+
+    def pending(self, conn):
+        existing = set(db.inspect(conn).get_table_names())
+        return [table.name for table in db.metadata.sorted_tables if table.name not in existing]
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        return [f"CREATE TABLE {name}" for name in self.pending(conn)]
+
+    def apply(self, conn):
+        db.metadata.create_all(conn, checkfirst=True)
+        conn.commit()
+
+
+class AddColumn:
+    """ALTER TABLE ... ADD COLUMN when the column is missing"""
+
+    def __init__(self, table, column, ddl_type):
+        self.table, self.column, self.ddl_type = table, column, ddl_type
+
+    def describe(self):
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.ddl_type}"
+
+    def pending(self, conn):
+        # A table still to be created by CreateTables comes with the column
+        columns = _columns(conn, self.table)
+        return columns is not None and self.column not in columns
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        return [self.describe()] if self.pending(conn) else []
+
+    def apply(self, conn):
+        with _ddl(conn):
+            conn.execute(db.text(self.describe()))
+
+
+class AlterColumnType:
+    """Widen a VARCHAR column (PostgreSQL only; SQLite does not enforce lengths)"""
+
+    def __init__(self, table, column, length):
+        self.table, self.column, self.length = table, column, length
+
+    def describe(self):
+        return f"ALTER TABLE {self.table} ALTER COLUMN {self.column} TYPE VARCHAR({self.length})"
+
+    def pending(self, conn):
+        if conn.dialect.name != 'postgresql':
+            return False
+        current = conn.execute(db.text(
+            "SELECT character_maximum_length FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name = :column"
+        ), {'table': self.table, 'column': self.column}).scalar()
+        return current is not None and current < self.length
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        return [self.describe()] if self.pending(conn) else []
+
+    def apply(self, conn):
+        # Increasing a varchar limit is a catalog-only change on PostgreSQL, no table rewrite
+        with _ddl(conn):
+            conn.execute(db.text(self.describe()))
+
+
+class CreateIndex:
+    """CREATE [UNIQUE] INDEX, CONCURRENTLY on PostgreSQL
+
+    A failed concurrent build leaves an INVALID index behind; it is dropped
+    and rebuilt on the next run. Unique indexes are pre-checked for
+    duplicate keys so a dry run reports them before anything is built.
+
+    On a partitioned table (see partitions.py) the index is created ON ONLY
+    the parent, built concurrently on each partition and attached; it turns
+    valid once every partition is attached, and reruns resume the attaching.
+    """
+
+    def __init__(self, name, table, columns, unique=False, where=None):
+        self.name, self.table, self.columns = name, table, columns
+        self.unique, self.where = unique, where
+
+    def describe(self, concurrently=False, name=None, table=None, only=False):
+        return (f"CREATE {'UNIQUE ' if self.unique else ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+                f"IF NOT EXISTS {name or self.name} ON {'ONLY ' if only else ''}{table or self.table} "
+                f"({', '.join(self.columns)})" + (f" WHERE {self.where}" if self.where else ''))
+
+    def _partitioned_statements(self, partitions):
+        statements = [self.describe(only=True)]
+        for partition in partitions:
+            child = f"{partition}_{self.name}"[:63]
+            statements.append(self.describe(concurrently=True, name=child, table=partition))
+            statements.append(f"ALTER INDEX {self.name} ATTACH PARTITION {child}")
+        return statements
+
+    def _state(self, conn):
+        """None if missing, else whether the index is valid"""
+        if _columns(conn, self.table) is None:
+            return True  # Built along with the table by CreateTables
+        if conn.dialect.name == 'postgresql':
+            row = conn.execute(db.text(
+                "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name"
+            ), {'name': self.name}).first()
+            return None if row is None else row[0]
+        names = {index['name'] for index in db.inspect(conn).get_indexes(self.table)}
+        return True if self.name in names else None
+
+    def pending(self, conn):
+        return self._state(conn) is not True
+
+    def check(self, conn):
+        if not self.unique or not self.pending(conn):
+            return None
+        if _partitions(conn, self.table) is not None:
+            return f"{self.name}: unique indexes on partitioned {self.table} must include the partition key"
+        if not set(self.columns) <= _columns(conn, self.table):
+            return None  # Columns added by this run are empty
+        conditions = [f"{column} IS NOT NULL" for column in self.columns]  # NULLs never collide
+        if self.where:
+            conditions.append(f"({self.where})")
+        duplicates = conn.execute(db.text(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} WHERE {' AND '.join(conditions)} "
+            f"GROUP BY {', '.join(self.columns)} HAVING COUNT(*) > 1) AS duplicates"
+        )).scalar()
+        if duplicates:
+            return f"{self.name}: {duplicates} duplicate key groups in {self.table}; resolve them first"
+        return None
+
+    def plan(self, conn):
+        state = self._state(conn)
+        if state is True:
+            return []
+        partitions = _partitions(conn, self.table)
+        if partitions is not None:
+            return self._partitioned_statements(partitions)
+        concurrently = conn.dialect.name == 'postgresql'
+        statements = [f"DROP INDEX CONCURRENTLY {self.name}"] if state is False else []
+        return statements + [self.describe(concurrently)]
+
+    def apply(self, conn):
+        if conn.dialect.name != 'postgresql':
+            with conn.begin():
+                conn.execute(db.text(self.describe()))
+            return
+        # CONCURRENTLY cannot run inside a transaction block
+        autocommit = conn.execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            partitions = _partitions(autocommit, self.table)
+            if partitions is not None:
+                for statement in self._partitioned_statements(partitions):
+                    autocommit.execute(db.text(statement))
+                return
+            if self._state(autocommit) is False:
+                autocommit.execute(db.text(f"DROP INDEX CONCURRENTLY {self.name}"))
+            autocommit.execute(db.text(self.describe(concurrently=True)))
+        finally:
+            conn.execution_options(isolation_level=conn.default_isolation_level)
+
+
+class Backfill:
+    """UPDATE table SET ... WHERE ... in id-ordered batches, one transaction each"""
+
+    def __init__(self, table, column, assignments, where):
+        self.table, self.column = table, column
+        self.assignments, self.where = assignments, where
+
+    def describe(self):
+        return f"UPDATE {self.table} SET {self.assignments} WHERE {self.where}"
+
+    def _remaining(self, conn):
+        if self.column not in (_columns(conn, self.table) or ()):
+            return 0  # Not there yet: it is added with its default by this run
+        return conn.execute(db.text(f"SELECT COUNT(*) FROM {self.table} WHERE {self.where}")).scalar()
+
+    def pending(self, conn):
+        return self._remaining(conn) > 0
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        remaining = self._remaining(conn)
+        if not remaining:
+            return []
+        batch_size = _config('MIGRATION_BATCH_SIZE', 1000)
+        return [f"{self.describe()}  -- {remaining} rows, batches of {batch_size}"]
+
+    def apply(self, conn):
+        batch_size = _config('MIGRATION_BATCH_SIZE', 1000)
+        pause = _config('MIGRATION_BATCH_PAUSE_SECONDS', 0.1)
+        updated = 0
+        while True:
+            with conn.begin():
+                count = conn.execute(db.text(
+                    f"UPDATE {self.table} SET {self.assignments} WHERE id IN "
+                    f"(SELECT id FROM {self.table} WHERE {self.where} ORDER BY id LIMIT :batch_size)"
+                ), {'batch_size': batch_size}).rowcount
+            if not count:
+                break
+            updated += count
+            print(f"   … backfilled {updated} rows of {self.table}")
+            time.sleep(pause)
+
+
+class SQLiteAutoincrement:
+    """Rebuild a SQLite table as INTEGER PRIMARY KEY AUTOINCREMENT (other databases never reuse ids)
+
+    SQLite cannot alter a primary key, so the table is renamed, recreated
+    from its model with its indexes, refilled and dropped in one
+    transaction; writers wait on the database lock meanwhile. The id
+    sequence starts past both the table's ids and `floor_table`'s, so ids
+    already deleted from the table are not handed out again.
+    """
+
+    def __init__(self, table, floor_table=None):
+        self.table, self.floor_table = table, floor_table
+
+    def describe(self):
+        return f"rebuild {self.table} with AUTOINCREMENT ids"
+
+    def pending(self, conn):
+        if conn.dialect.name != 'sqlite':
+            return False
+        sql = conn.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"
+        ), {'table': self.table}).scalar()
+        return sql is not None and 'AUTOINCREMENT' not in sql.upper()
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        if not self.pending(conn):
+            return []
+        rows = conn.execute(db.text(f"SELECT COUNT(*) FROM {self.table}")).scalar()
+        return [f"{self.describe()}  -- {rows} rows copied in one transaction"]
+
+    def apply(self, conn):
+        table = db.metadata.tables[self.table]
+        old = f"_{self.table}_rebuild"
+        with conn.begin():
+            indexes = conn.execute(db.text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+            ), {'table': self.table}).scalars().all()
+            for name in indexes:
+                conn.execute(db.text(f"DROP INDEX {name}"))
+            conn.execute(db.text(f"ALTER TABLE {self.table} RENAME TO {old}"))
+            table.create(conn)
+            existing = _columns(conn, old)
+            columns = ', '.join(column.name for column in table.columns if column.name in existing)
+            conn.execute(db.text(f"INSERT INTO {self.table} ({columns}) SELECT {columns} FROM {old}"))
+            conn.execute(db.text(f"DROP TABLE {old}"))
+            floor = conn.execute(db.text(f"SELECT MAX(id) FROM {self.floor_table}")).scalar() if self.floor_table else None
+            if floor:
+                conn.execute(db.text("DELETE FROM sqlite_sequence WHERE name = :table"), {'table': self.table})
+                conn.execute(db.text(
+                    f"INSERT INTO sqlite_sequence (name, seq) SELECT :table, MAX(:floor, COALESCE(MAX(id), 0)) "
+                    f"FROM {self.table}"
+                ), {'table': self.table, 'floor': floor})
+
+
+class Call:
+    """Run an idempotent setup function (its own connection and transaction)"""
+
+    def __init__(self, function, description):
+        self.function, self.description = function, description
+
+    def describe(self):
+        return self.description
+
+    def pending(self, conn):
+        return True
+
+    def check(self, conn):
+        return None
+
+    def plan(self, conn):
+        return [self.description]
+
+    def apply(self, conn):
+        self.function()
+
+
+def _add_columns(table, columns):
+    return [AddColumn(table, name, ddl_type) for name, ddl_type in columns]
+
+
+TOKEN_TIMING_COLUMNS = [
+    ('leave_time', 'TIMESTAMP'),
+    ('reach_time', 'TIMESTAMP'),
+    ('estimated_service_start', 'TIMESTAMP'),
+    ('estimated_service_end', 'TIMESTAMP'),
+    ('actual_service_start', 'TIMESTAMP'),
+    ('actual_service_end', 'TIMESTAMP'),
+    ('completed_time', 'TIMESTAMP'),
+    ('no_show_reason', 'VARCHAR(500)'),
+    ('no_show_time', 'TIMESTAMP'),
+    ('is_walkin', 'BOOLEAN DEFAULT FALSE'),
+]
+TOKEN_WALKIN_COLUMNS = [('walkin_name', 'VARCHAR(100)'), ('walkin_mobile', 'VARCHAR(20)')]
+TOKEN_IDEMPOTENCY_COLUMNS = [('booking_key', 'VARCHAR(64)'), ('payment_key', 'VARCHAR(64)')]
+
+# (version, description, steps) — append only
+MIGRATIONS = [
+    ('0001_base_tables', 'Create any missing tables', [
+        CreateTables(),
+    ]),
+    ('0002_users_mobile_length', 'Widen users.mobile for walk-in numbers', [
+        AlterColumnType('users', 'mobile', 20),
+    ]),
+    ('0003_service_center_details', 'Service center profile and versioning columns', _add_columns('service_centers', [
+        ('description', 'VARCHAR(500)'),
+        ('phone', 'VARCHAR(15)'),
+        ('email', 'VARCHAR(100)'),
+        ('website', 'VARCHAR(100)'),
+        ('business_hours', 'VARCHAR(100)'),
+        ('services_offered', 'VARCHAR(500)'),
+        ('facilities', 'VARCHAR(500)'),
+        ('version', 'INTEGER NOT NULL DEFAULT 1'),
+        ('queue_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ])),
+    ('0004_token_timing', 'Stored token timing, no-show and walk-in columns',
+     _add_columns('tokens', TOKEN_TIMING_COLUMNS + TOKEN_WALKIN_COLUMNS)),
+    ('0005_token_is_walkin_backfill', 'is_walkin = false where NULL (rows older than the column)', [
+        Backfill('tokens', 'is_walkin', 'is_walkin = false', 'is_walkin IS NULL'),
+    ]),
+    ('0006_lookup_indexes', 'Live-queue, history and login/reset lookup indexes', [
+        CreateIndex('ix_tokens_center_status_walkin_id', 'tokens', ['service_center_id', 'status', 'is_walkin', 'id']),
+        CreateIndex('ix_tokens_center_created', 'tokens', ['service_center_id', 'created_time', 'id']),
+        CreateIndex('ix_tokens_user_created', 'tokens', ['user_id', 'created_time', 'id']),
+        CreateIndex('ix_registrations_status_submitted', 'service_center_registrations', ['status', 'submitted_time', 'id']),
+        CreateIndex('ix_registrations_status_reviewed', 'service_center_registrations', ['status', 'reviewed_time', 'id']),
+        CreateIndex('ix_users_email', 'users', ['email']),
+        CreateIndex('ix_users_reset_token', 'users', ['reset_token']),
+        CreateIndex('ix_admins_reset_token', 'admins', ['reset_token']),
+        CreateIndex('ix_registrations_phone', 'service_center_registrations', ['phone']),
+        CreateIndex('ix_registrations_email', 'service_center_registrations', ['email']),
+    ]),
+    ('0007_one_active_token', 'One live online token per user', [
+        CreateIndex('ux_tokens_user_active', 'tokens', ['user_id'], unique=True, where=ACTIVE_TOKEN_PREDICATE),
+    ]),
+    ('0008_token_idempotency', 'Booking/payment idempotency keys', _add_columns('tokens', TOKEN_IDEMPOTENCY_COLUMNS) + [
+        CreateIndex('ux_tokens_user_booking_key', 'tokens', ['user_id', 'booking_key'], unique=True),
+    ]),
+    ('0009_tokens_archive', 'tokens_archive, with the token columns added since it was introduced', [
+        CreateTables(),
+    ] + _add_columns('tokens_archive', TOKEN_WALKIN_COLUMNS + TOKEN_IDEMPOTENCY_COLUMNS)),
+    ('0010_center_search', 'Full-text search index over service centers', [
+        Call(ensure_search_index, 'ensure service center search index'),
+    ]),
+    ('0011_payment_claim_time', 'When a payment claimed its token, so abandoned claims expire',
+     _add_columns('tokens', [('payment_claimed_time', 'TIMESTAMP')])
+     + _add_columns('tokens_archive', [('payment_claimed_time', 'TIMESTAMP')])),
+    ('0012_center_search_update_trigger', 'Search index update trigger fires only for the indexed columns', [
+        Call(ensure_search_index, 'replace service_centers_fts_au with AFTER UPDATE OF the indexed columns'),
+    ]),
+    ('0013_registration_reviewed_time_backfill', 'reviewed_time for reviewed registrations that lack one, '
+     'so the dashboard pages them on ix_registrations_status_reviewed', [
+        Backfill('service_center_registrations', 'reviewed_time',
+                 'reviewed_time = coalesce(submitted_time, CURRENT_TIMESTAMP)',
+                 "status IN ('Approved', 'Rejected') AND reviewed_time IS NULL"),
+    ]),
+    ('0014_walkin_guest_email', 'Walk-in guest user gets an address that cannot receive mail', [
+        Backfill('users', 'email', f"email = '{WALKIN_GUEST_EMAIL}', reset_token = NULL",
+                 f"mobile = '{WALKIN_GUEST_MOBILE}' AND email = 'walkin@queueflow.com'"),
+    ]),
+    ('0015_tokens_autoincrement', 'SQLite never reuses token ids, which tokens_archive keeps', [
+        SQLiteAutoincrement('tokens', floor_table='tokens_archive'),
+    ]),
+]
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    conn.commit()
+    return set(conn.execute(db.select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(target=None, dry_run=False):
+    """Apply (or, on dry_run, plan and check) pending versions up to `target`
+
+    Returns (versions, problems): the versions applied or planned, and the
+    pre-flight problems found. Nothing is applied if any check fails.
+    """
+    versions = [version for version, _, _ in MIGRATIONS]
+    if target is not None and target not in versions:
+        raise ValueError(f"Unknown migration version {target!r}")
+
+    with db.engine.connect() as conn:
+        applied = applied_versions(conn)
+        pending = []
+        for version, description, steps in MIGRATIONS:
+            if version not in applied:
+                pending.append((version, description, steps))
+            if version == target:
+                break
+
+        problems = []
+        for version, description, steps in pending:
+            print(f"{version}: {description}")
+            for step in steps:
+                problem = step.check(conn)
+                if problem:
+                    problems.append(f"{version}: {problem}")
+                    print(f"   ✗ {problem}")
+                if dry_run:
+                    statements = step.plan(conn)
+                    for statement in statements:
+                        print(f"   {statement}")
+                    if not statements:
+                        print(f"   ✓ already satisfied: {step.describe()}")
+            conn.rollback()  # Don't hold the checks' snapshot while DDL waits
+
+        if dry_run or problems:
+            return [version for version, _, _ in pending], problems
+
+        for version, description, steps in pending:
+            for step in steps:
+                if step.pending(conn):
+                    conn.rollback()
+                    step.apply(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_time=get_ist_now()
+            ))
+            conn.commit()
+            print(f"✅ Applied {version}")
+        return [version for version, _, _ in pending], problems
@@ -17,6 +17,12 @@ class User(db.Model):
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
     tokens = db.relationship('Token', backref='user', lazy=True)
 
+    __table_args__ = (
+        # Login accepts mobile or email; reset links look up by token
+        db.Index('ix_users_email', 'email'),
+        db.Index('ix_users_reset_token', 'reset_token'),
+    )
+
 
 class ServiceCenter(db.Model):
     __tablename__ = 'service_centers'
@@ -34,6 +40,8 @@ class ServiceCenter(db.Model):
     business_hours = db.Column(db.String(100), nullable=True)
     services_offered = db.Column(db.String(500), nullable=True)
     facilities = db.Column(db.String(500), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped on every edit
+    queue_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped on every token change
     tokens = db.relationship('Token', backref='service_center', lazy=True)
     admins = db.relationship('Admin', backref='service_center', lazy=True)
 
@@ -48,8 +56,31 @@ class Admin(db.Model):
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
     service_center_id = db.Column(db.Integer, db.ForeignKey('service_centers.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_admins_reset_token', 'reset_token'),
+    )
+
+
+ACTIVE_TOKEN_PREDICATE = "status IN ('PendingPayment', 'Active', 'Serving') AND is_walkin = false"
+
+
+class CustomerMixin:
+    """Who a token is for: the walk-in's own details, else the booking user"""
+
+    @property
+    def customer_name(self):
+        if self.walkin_name:
+            return self.walkin_name
+        return self.user.name if self.user else 'Unknown'
+
+    @property
+    def customer_mobile(self):
+        if self.walkin_name:
+            return self.walkin_mobile or ''
+        return self.user.mobile if self.user else ''
 
-class Token(db.Model):
+
+class Token(CustomerMixin, db.Model):
     __tablename__ = 'tokens'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -73,6 +104,75 @@ class Token(db.Model):
     no_show_time = db.Column(db.DateTime, nullable=True)
     is_walkin = db.Column(db.Boolean, default=False)
 
+    # Walk-ins without an account are issued to the shared guest user; these hold who they are
+    walkin_name = db.Column(db.String(100), nullable=True)
+    walkin_mobile = db.Column(db.String(20), nullable=True)
+
+    # Idempotency keys of the request that created / paid for this token
+    booking_key = db.Column(db.String(64), nullable=True)
+    payment_key = db.Column(db.String(64), nullable=True)
+    # When payment_key claimed the token; a claim older than PAYMENT_CLAIM_TIMEOUT_SECONDS is abandoned
+    payment_claimed_time = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Live-queue lookups: "tokens of this center/lane in this status, in booking order"
+        db.Index('ix_tokens_center_status_walkin_id', 'service_center_id', 'status', 'is_walkin', 'id'),
+        # Keyset-paginated history views, newest first
+        db.Index('ix_tokens_center_created', 'service_center_id', 'created_time', 'id'),
+        db.Index('ix_tokens_user_created', 'user_id', 'created_time', 'id'),
+        # One live online token per user, enforced by the database (walk-ins are exempt:
+        # anonymous ones all share the guest user)
+        db.Index('ux_tokens_user_active', 'user_id', unique=True,
+                 postgresql_where=db.text(ACTIVE_TOKEN_PREDICATE),
+                 sqlite_where=db.text(ACTIVE_TOKEN_PREDICATE)),
+        # Replayed booking requests find their token by key
+        db.Index('ux_tokens_user_booking_key', 'user_id', 'booking_key', unique=True),
+        # tokens_archive keeps the ids, so SQLite must never hand a deleted max(id) out again
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ArchivedToken(CustomerMixin, db.Model):
+    """Finished tokens moved out of `tokens` by archive.archive_finished_tokens()
+
+    Same columns and ids as Token, so history, exports and analytics can read
+    both tables as one. There are no foreign keys; the user and
+    service_center relationships are for display only.
+    """
+    __tablename__ = 'tokens_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    service_center_id = db.Column(db.Integer, nullable=False)
+    token_number = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20))
+    created_time = db.Column(db.DateTime)
+    completed_time = db.Column(db.DateTime, nullable=True)
+    leave_time = db.Column(db.DateTime, nullable=True)
+    reach_time = db.Column(db.DateTime, nullable=True)
+    estimated_service_start = db.Column(db.DateTime, nullable=True)
+    estimated_service_end = db.Column(db.DateTime, nullable=True)
+    actual_service_start = db.Column(db.DateTime, nullable=True)
+    actual_service_end = db.Column(db.DateTime, nullable=True)
+    no_show_reason = db.Column(db.String(500), nullable=True)
+    no_show_time = db.Column(db.DateTime, nullable=True)
+    is_walkin = db.Column(db.Boolean, default=False)
+    walkin_name = db.Column(db.String(100), nullable=True)
+    walkin_mobile = db.Column(db.String(20), nullable=True)
+    booking_key = db.Column(db.String(64), nullable=True)
+    payment_key = db.Column(db.String(64), nullable=True)
+    payment_claimed_time = db.Column(db.DateTime, nullable=True)
+    archived_time = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User', primaryjoin='foreign(ArchivedToken.user_id) == User.id', viewonly=True)
+    service_center = db.relationship(
+        'ServiceCenter', primaryjoin='foreign(ArchivedToken.service_center_id) == ServiceCenter.id', viewonly=True
+    )
+
+    __table_args__ = (
+        db.Index('ix_tokens_archive_center_created', 'service_center_id', 'created_time', 'id'),
+        db.Index('ix_tokens_archive_user_created', 'user_id', 'created_time', 'id'),
+    )
+
 
 class SuperAdmin(db.Model):
     __tablename__ = 'super_admins'
@@ -114,3 +214,11 @@ class ServiceCenterRegistration(db.Model):
     status = db.Column(db.String(20), default='Pending')  # Pending, Approved, Rejected
     submitted_time = db.Column(db.DateTime, default=datetime.now)
     reviewed_time = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_registrations_status_submitted', 'status', 'submitted_time', 'id'),
+        db.Index('ix_registrations_status_reviewed', 'status', 'reviewed_time', 'id'),
+        # Owner login accepts phone or email
+        db.Index('ix_registrations_phone', 'phone'),
+        db.Index('ix_registrations_email', 'email'),
+    )
@@ -0,0 +1,192 @@
+"""Optional monthly range partitioning of tokens by created_time (PostgreSQL)
+
+The Token model is unchanged: PostgreSQL routes rows to partitions and
+queries see one `tokens` table. To enable it:
+
+    flask admin partition-tokens --dry-run    # one-off conversion
+    flask admin partition-tokens
+    TOKEN_PARTITIONING=1                      # bound live-queue queries
+
+then schedule `flask admin maintain-token-partitions` daily. It creates the
+next TOKEN_PARTITION_MONTHS_AHEAD months and retires months wholly older
+than TOKEN_ARCHIVE_AFTER_DAYS: their rows are copied into tokens_archive and
+the partition is detached and dropped, instead of deleting row by row.
+
+Partitioned tables only allow unique indexes that contain the partition
+key, so the one-active-token and booking-key indexes are created per
+partition (named ux_tokens_user_active_YYYYMM etc.). They are enforced
+within a month; with TOKEN_PARTITIONING on, live tokens never outlive the
+live-queue window, so only a booking in the first hours of a month can slip
+past a token still live from the previous one.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import ACTIVE_TOKEN_PREDICATE, ArchivedToken, Token
+from archive import ARCHIVED_COLUMNS
+from utils import expire_stale_live_tokens, get_ist_now
+
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f"tokens_p{month:%Y%m}"
+
+
+def _partition_month(name):
+    return datetime.strptime(name[len('tokens_p'):], '%Y%m')
+
+
+def is_partitioned(conn):
+    return conn.execute(db.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'tokens'"
+    )).first() is not None
+
+
+def list_partitions(conn):
+    """[(name, month)] of tokens' partitions, oldest first"""
+    names = conn.execute(db.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'tokens' ORDER BY c.relname"
+    )).scalars()
+    return [(name, _partition_month(name)) for name in names]
+
+
+def partition_statements(month):
+    """DDL for one month's partition and its per-partition unique indexes"""
+    name, suffix = _partition_name(month), f"{month:%Y%m}"
+    return [
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF tokens "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_tokens_user_active_{suffix} ON {name} (user_id) "
+        f"WHERE {ACTIVE_TOKEN_PREDICATE}",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS ux_tokens_user_booking_key_{suffix} ON {name} (user_id, booking_key)",
+    ]
+
+
+def _require_postgres(conn):
+    if conn.dialect.name != 'postgresql':
+        raise RuntimeError("Token partitioning needs PostgreSQL")
+
+
+def partition_tokens(months_ahead=None, dry_run=False):
+    """Convert tokens into a partitioned table, in one transaction
+
+    The old table is renamed tokens_unpartitioned (kept until you drop it)
+    and its rows copied into monthly partitions. The copy holds an ACCESS
+    EXCLUSIVE lock on tokens for its duration, so run it at a quiet hour
+    after `flask admin archive-tokens` has trimmed the table.
+    Returns the statements executed (or planned, on dry_run).
+    """
+    if months_ahead is None:
+        months_ahead = current_app.config.get('TOKEN_PARTITION_MONTHS_AHEAD', 3)
+
+    with db.engine.connect() as conn:
+        _require_postgres(conn)
+        if is_partitioned(conn):
+            return []
+
+        now = get_ist_now()
+        oldest = conn.execute(db.text(
+            "SELECT MIN(COALESCE(created_time, completed_time, no_show_time)) FROM tokens"
+        )).scalar() or now
+        index_names = conn.execute(db.text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'tokens' "
+            "AND indexname <> 'tokens_pkey'"
+        )).scalars().all()
+        conn.rollback()
+
+        statements = [
+            "LOCK TABLE tokens IN ACCESS EXCLUSIVE MODE",
+            # Rows must have a partition key to be routed
+            f"UPDATE tokens SET created_time = COALESCE(completed_time, no_show_time, '{now:%Y-%m-%d %H:%M:%S}') "
+            "WHERE created_time IS NULL",
+            "ALTER TABLE tokens RENAME TO tokens_unpartitioned",
+            "ALTER TABLE tokens_unpartitioned RENAME CONSTRAINT tokens_pkey TO tokens_unpartitioned_pkey",
+        ]
+        statements += [f"ALTER INDEX {name} RENAME TO {name[:50]}_unpartitioned" for name in index_names]
+        statements += [
+            "CREATE TABLE tokens (LIKE tokens_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_time)",
+            "ALTER TABLE tokens ALTER COLUMN created_time SET NOT NULL",
+            "ALTER TABLE tokens ADD CONSTRAINT tokens_pkey PRIMARY KEY (id, created_time)",
+            "ALTER TABLE tokens ADD FOREIGN KEY (user_id) REFERENCES users (id)",
+            "ALTER TABLE tokens ADD FOREIGN KEY (service_center_id) REFERENCES service_centers (id)",
+            "ALTER SEQUENCE IF EXISTS tokens_id_seq OWNED BY tokens.id",
+        ]
+        # Non-unique model indexes go on the parent and cascade to every partition
+        statements += [
+            str(db.schema.CreateIndex(index).compile(dialect=conn.dialect))
+            for index in sorted(Token.__table__.indexes, key=lambda index: index.name) if not index.unique
+        ]
+        month = _month_start(oldest)
+        last = _add_months(_month_start(now), months_ahead)
+        while month <= last:
+            statements += partition_statements(month)
+            month = _add_months(month, 1)
+        statements.append("INSERT INTO tokens SELECT * FROM tokens_unpartitioned")
+
+        if dry_run:
+            return statements
+        with conn.begin():
+            for statement in statements:
+                conn.execute(db.text(statement))
+        return statements
+
+
+def maintain_token_partitions(months_ahead=None, dry_run=False):
+    """Create upcoming monthly partitions and retire expired ones
+
+    Returns (created, retired) partition names. A retired month's rows are
+    copied to tokens_archive (including any never finished; they are long
+    dead) before the partition is detached and dropped, one transaction per
+    month. Also expires live tokens left behind the live-queue window.
+    """
+    config = current_app.config
+    if months_ahead is None:
+        months_ahead = config.get('TOKEN_PARTITION_MONTHS_AHEAD', 3)
+    now = get_ist_now()
+    cutoff = now - timedelta(days=max(config.get('TOKEN_ARCHIVE_AFTER_DAYS', 90), 1))
+
+    with db.engine.connect() as conn:
+        _require_postgres(conn)
+        if not is_partitioned(conn):
+            raise RuntimeError("tokens is not partitioned; run `flask admin partition-tokens` first")
+        existing = dict(list_partitions(conn))
+        conn.rollback()
+
+        upcoming = [_add_months(_month_start(now), offset) for offset in range(months_ahead + 1)]
+        created = [_partition_name(month) for month in upcoming if _partition_name(month) not in existing]
+        retired = [name for name, month in existing.items() if _add_months(month, 1) <= cutoff]
+        if dry_run:
+            return created, retired
+
+        for month in upcoming:
+            with conn.begin():
+                for statement in partition_statements(month):
+                    conn.execute(db.text(statement))
+
+        columns = ', '.join(ARCHIVED_COLUMNS)
+        for name in retired:
+            with conn.begin():
+                conn.execute(db.text(
+                    f"INSERT INTO {ArchivedToken.__tablename__} ({columns}, archived_time) "
+                    f"SELECT {columns}, :now FROM {name}"
+                ), {'now': now})
+                conn.execute(db.text(f"ALTER TABLE tokens DETACH PARTITION {name}"))
+                conn.execute(db.text(f"DROP TABLE {name}"))
+            print(f"📦 Retired partition {name} into tokens_archive")
+
+    if expire_stale_live_tokens():
+        db.session.commit()
+    return created, retired
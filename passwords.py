@@ -0,0 +1,44 @@
+"""Password hashing with a configurable cost and rehash-on-login
+
+PASSWORD_HASH_METHOD is any werkzeug method string, e.g. 'scrypt:32768:8:1'
+(werkzeug's default) or 'pbkdf2:sha256:600000'; see
+benchmarks/bench_password_hash.py for choosing one. Hashes made with a
+different method keep working and are upgraded the next time their owner
+logs in, so changing the setting needs no migration.
+"""
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+
+
+@lru_cache(maxsize=8)
+def _stored_prefix(method):
+    # What werkzeug writes before the salt for this method, defaults filled in
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=_method())
+
+
+def needs_rehash(pwhash):
+    return pwhash.split('$', 1)[0] != _stored_prefix(_method())
+
+
+def verify_password(account, password):
+    """Check account.password; on success upgrade an outdated hash in place
+
+    The caller commits, so the upgrade lands with the rest of the login.
+    """
+    if not account or not check_password_hash(account.password, password):
+        return False
+    if needs_rehash(account.password):
+        account.password = hash_password(password)
+    return True
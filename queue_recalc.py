@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+
+from flask import current_app
+
+from cache import get_cache
+from events import publish_queue_change
+from utils import recalculate_queue_suffix
+
+# Jobs are queued and run per process; the shared cache carries the "times
+# updating" flag to the other workers (with CACHE_URL set to a shared backend)
+PENDING_NAMESPACE = 'queue_recalc_pending'
+PENDING_FLAG_GRACE_SECONDS = 30  # Flag outlives a worker that dies mid-job by at most this
+
+# center_id -> {'deadline': monotonic seconds, 'removed': set of token ids}
+_pending = {}
+_running = set()
+_cond = threading.Condition()
+_worker = None
+
+
+def schedule_queue_recalculation(center_id, removed_token_id):
+    """Queue a suffix recalculation for a center and return immediately
+
+    Requests for the same center within QUEUE_RECALC_DEBOUNCE_SECONDS are
+    coalesced into one job run by a single background worker. With
+    QUEUE_RECALC_ASYNC disabled the recalculation runs inline.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('QUEUE_RECALC_ASYNC', True):
+        recalculate_queue_suffix(center_id, removed_token_id)
+        publish_queue_change(center_id, 'times')
+        return
+
+    window = app.config.get('QUEUE_RECALC_DEBOUNCE_SECONDS', 2)
+    get_cache().ns_set(PENDING_NAMESPACE, center_id, os.getpid(), ttl=window + PENDING_FLAG_GRACE_SECONDS)
+    with _cond:
+        job = _pending.get(center_id)
+        if job is None:
+            job = _pending[center_id] = {'deadline': time.monotonic() + window, 'removed': set()}
+        job['removed'].add(removed_token_id)
+        _ensure_worker(app)
+        _cond.notify()
+
+
+def is_recalculation_pending(center_id):
+    """True while a center's queue times are queued or being recalculated
+
+    Exact for jobs queued in this process. Jobs queued by other workers are
+    seen through the shared cache flag, so with the default per-process
+    local:// cache another worker's recalculation goes unreported.
+    """
+    with _cond:
+        if center_id in _pending or center_id in _running:
+            return True
+    return get_cache().ns_get(PENDING_NAMESPACE, center_id) is not None
+
+
+def _clear_pending_flag(center_id):
+    """Drop the shared flag unless the center has since been queued again, here or by another worker"""
+    with _cond:
+        if center_id in _pending:
+            return
+    cache = get_cache()
+    if cache.ns_get(PENDING_NAMESPACE, center_id) == os.getpid():
+        cache.ns_delete(PENDING_NAMESPACE, center_id)
+
+
+def _ensure_worker(app):
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, args=(app,), name='queue-recalc', daemon=True)
+        _worker.start()
+
+
+def _next_due_job():
+    """Block until a job's window has closed, then claim it"""
+    with _cond:
+        while True:
+            now = time.monotonic()
+            due = [cid for cid, job in _pending.items() if job['deadline'] <= now]
+            if due:
+                center_id = due[0]
+                _running.add(center_id)
+                return center_id, _pending.pop(center_id)['removed']
+            timeout = min((job['deadline'] for job in _pending.values()), default=now + 60) - now
+            _cond.wait(timeout)
+
+
+def _run(app):
+    while True:
+        center_id, removed = _next_due_job()
+        try:
+            with app.app_context():
+                try:
+                    # Earliest gap first so later gaps see the already-shifted predecessors
+                    for token_id in sorted(removed):
+                        recalculate_queue_suffix(center_id, token_id)
+                finally:
+                    _clear_pending_flag(center_id)
+                publish_queue_change(center_id, 'times')
+        except Exception as e:
+            print(f"❌ Queue recalculation worker error for center {center_id}: {e}")
+        finally:
+            with _cond:
+                _running.discard(center_id)
@@ -0,0 +1,40 @@
+"""Per-center queue version
+
+service_centers.queue_version is bumped in the same transaction as any
+change to that center's tokens, so pollers can tell whether a queue changed
+with a primary-key read of one small row instead of querying tokens.
+ORM flushes are covered automatically; bulk UPDATEs on tokens must call
+bump_queue_version() themselves.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import ServiceCenter, Token
+
+
+def get_queue_version(center_id):
+    return db.session.query(ServiceCenter.queue_version).filter(ServiceCenter.id == center_id).scalar() or 0
+
+
+def bump_queue_version(center_ids, connection=None):
+    """Increment queue_version for the given centers in the current transaction"""
+    center_ids = {cid for cid in center_ids if cid is not None}
+    if not center_ids:
+        return
+    statement = db.update(ServiceCenter).where(ServiceCenter.id.in_(center_ids)).values(
+        queue_version=ServiceCenter.queue_version + 1
+    ).execution_options(synchronize_session=False)
+    (connection or db.session).execute(statement)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_token_flush(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    center_ids = {
+        obj.service_center_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Token) and (obj not in session.dirty or session.is_modified(obj))
+    }
+    if center_ids:
+        bump_queue_version(center_ids, session.connection())
@@ -0,0 +1,118 @@
+"""Route read-only views to a replica database
+
+Set REPLICA_DATABASE_URL to add a 'replica' bind, then mark views that can
+tolerate slightly old data:
+
+    @admin_bp.route('/history')
+    @read_replica()
+    def admin_history(): ...
+
+For the rest of that request, ORM and Core reads through db.session go to
+the replica, as long as it is no more than REPLICA_MAX_STALENESS_SECONDS
+behind (or the decorator's max_staleness). Otherwise, or if the replica is
+unreachable, the request stays on the primary. Writes always go to the
+primary, and once a request writes, its later reads do too. db.engine and
+everything outside marked views are unaffected.
+
+Replica lag is measured at most every REPLICA_LAG_CHECK_SECONDS per process:
+from the WAL replay position on a PostgreSQL standby (0 for a server that
+is not in recovery, e.g. a second local database), and from the file
+modification times for two SQLite files, so copying the primary file over
+the replica simulates a caught-up replica locally.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+
+REPLICA_BIND = 'replica'
+
+_lag = {'checked_at': 0.0, 'seconds': None}
+_lock = threading.Lock()
+
+_PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads to the replica inside @read_replica views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('read_replica') and not self.info.get('primary_pinned'):
+            if self._flushing or getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None):
+                # Read-your-writes: everything after the first write stays on the primary
+                self.info['primary_pinned'] = True
+            else:
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _sqlite_mtime(engine):
+    path = engine.url.database
+    return max((os.path.getmtime(p) for p in (path, f'{path}-wal') if os.path.exists(p)), default=0.0)
+
+
+def measure_replica_lag(db):
+    """Seconds the replica is behind the primary, or None if unknown/unreachable"""
+    replica = db.engines[REPLICA_BIND]
+    try:
+        if replica.dialect.name == 'postgresql':
+            with replica.connect() as conn:
+                return float(conn.execute(_PG_LAG).scalar() or 0)
+        if replica.dialect.name == 'sqlite':
+            return max(0.0, _sqlite_mtime(db.engine) - _sqlite_mtime(replica))
+    except Exception as e:
+        print(f"⚠️ Replica lag check failed: {e}")
+    return None
+
+
+def replica_lag():
+    """measure_replica_lag(), cached for REPLICA_LAG_CHECK_SECONDS per process"""
+    db = current_app.extensions['sqlalchemy']
+    interval = current_app.config.get('REPLICA_LAG_CHECK_SECONDS', 2)
+    with _lock:
+        if time.monotonic() - _lag['checked_at'] < interval:
+            return _lag['seconds']
+        _lag['checked_at'] = time.monotonic()
+    seconds = measure_replica_lag(db)
+    with _lock:
+        _lag['seconds'] = seconds
+    return seconds
+
+
+def replica_is_fresh(max_staleness=None):
+    if REPLICA_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        return False
+    if max_staleness is None:
+        max_staleness = current_app.config.get('REPLICA_MAX_STALENESS_SECONDS', 10)
+    lag = replica_lag()
+    return lag is not None and lag <= max_staleness
+
+
+def read_replica(max_staleness=None):
+    """Decorator: serve this view's reads from the replica when it is fresh enough"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            g.read_replica = replica_is_fresh(max_staleness)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+@contextmanager
+def on_primary():
+    """Read from the primary inside a @read_replica view, e.g. to fill a shared cache"""
+    previous = g.get('read_replica')
+    g.read_replica = False
+    try:
+        yield
+    finally:
+        g.read_replica = previous
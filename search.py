@@ -0,0 +1,111 @@
+import re
+import threading
+
+from extensions import db
+
+SEARCH_COLUMNS = ['name', 'category', 'location', 'description', 'services_offered', 'facilities']
+
+# FTS5 external-content table kept in sync with service_centers by triggers
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS service_centers_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)}, content='service_centers', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS service_centers_fts_ai AFTER INSERT ON service_centers BEGIN
+        INSERT INTO service_centers_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS service_centers_fts_ad AFTER DELETE ON service_centers BEGIN
+        INSERT INTO service_centers_fts(service_centers_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    # Only the indexed columns: queue_version is bumped on every token write
+    f"""CREATE TRIGGER IF NOT EXISTS service_centers_fts_au
+        AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON service_centers BEGIN
+        INSERT INTO service_centers_fts(service_centers_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+        INSERT INTO service_centers_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+]
+
+# Weighted tsvector; the expression index updates itself with the row
+_PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '') || ' ' || "
+    "coalesce(services_offered, '') || ' ' || coalesce(facilities, '')), 'C')"
+)
+_PG_SETUP = [
+    f"CREATE INDEX IF NOT EXISTS ix_service_centers_search ON service_centers USING GIN (({_PG_DOCUMENT}))",
+]
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_search_index():
+    """Create the full-text index for the current database once per process"""
+    dialect = db.engine.dialect.name
+    if dialect in _ready:
+        return
+    with _ready_lock:
+        if dialect in _ready:
+            return
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                exists = conn.execute(db.text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'service_centers_fts'"
+                )).first()
+                update_trigger = conn.execute(db.text(
+                    "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'service_centers_fts_au'"
+                )).scalar()
+                if update_trigger and 'UPDATE OF' not in update_trigger:
+                    # Older trigger fired on every update; IF NOT EXISTS would keep it
+                    conn.execute(db.text("DROP TRIGGER service_centers_fts_au"))
+                for statement in _SQLITE_SETUP:
+                    conn.execute(db.text(statement))
+                if not exists:
+                    conn.execute(db.text("INSERT INTO service_centers_fts(service_centers_fts) VALUES ('rebuild')"))
+            elif dialect == 'postgresql':
+                for statement in _PG_SETUP:
+                    conn.execute(db.text(statement))
+        _ready.add(dialect)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:8]
+
+
+def search_centers(query, limit=20):
+    """[(center_id, rank)] best match first; every term is prefix-matched"""
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    ensure_search_index()
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rows = db.session.execute(db.text(
+            "SELECT rowid, bm25(service_centers_fts, 10.0, 5.0, 3.0, 1.0, 1.0, 1.0) AS rank "
+            "FROM service_centers_fts WHERE service_centers_fts MATCH :match "
+            "ORDER BY rank LIMIT :limit"
+        ), {'match': match, 'limit': limit}).all()
+        # bm25 is lower-is-better; flip so callers always sort descending
+        return [(row.rowid, -row.rank) for row in rows]
+    if dialect == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        rows = db.session.execute(db.text(
+            f"SELECT id, ts_rank({_PG_DOCUMENT}, to_tsquery('simple', :q)) AS rank "
+            f"FROM service_centers WHERE {_PG_DOCUMENT} @@ to_tsquery('simple', :q) "
+            "ORDER BY rank DESC LIMIT :limit"
+        ), {'q': tsquery, 'limit': limit}).all()
+        return [(row.id, row.rank) for row in rows]
+
+    # Other databases: unranked substring match on the name
+    from models import ServiceCenter
+    rows = db.session.query(ServiceCenter.id).filter(
+        db.and_(*[ServiceCenter.name.ilike(f'%{term}%') for term in terms])
+    ).limit(limit).all()
+    return [(row.id, 0.0) for row in rows]
@@ -1,6 +1,6 @@
-from werkzeug.security import generate_password_hash
 from extensions import db
 from models import ServiceCenter, Admin, User, SuperAdmin, ServiceCenterRegistration
+from passwords import hash_password
 
 
 def init_db(app):
@@ -231,25 +231,25 @@ def init_db(app):
         try:
             if Admin.query.count() == 0:
                 admins = [
-                    Admin(username='apollo@admin.com', password=generate_password_hash('admin123'), service_center_id=1),
-                    Admin(username='nagpurclinic@admin.com', password=generate_password_hash('admin123'), service_center_id=2),
-                    Admin(username='localclinic@admin.com', password=generate_password_hash('admin123'), service_center_id=3),
-                    Admin(username='motherindia@admin.com', password=generate_password_hash('admin123'), service_center_id=4),
-                    Admin(username='ashvatam@admin.com', password=generate_password_hash('admin123'), service_center_id=5),
-                    Admin(username='apna@admin.com', password=generate_password_hash('admin123'), service_center_id=6),
-                    Admin(username='agrawal@admin.com', password=generate_password_hash('admin123'), service_center_id=7),
-                    Admin(username='shree@admin.com', password=generate_password_hash('admin123'), service_center_id=8),
-                    Admin(username='sai@admin.com', password=generate_password_hash('admin123'), service_center_id=9),
-                    Admin(username='suyash@admin.com', password=generate_password_hash('admin123'), service_center_id=10),
-                    Admin(username='inc@admin.com', password=generate_password_hash('admin123'), service_center_id=11),
-                    Admin(username='apple@admin.com', password=generate_password_hash('admin123'), service_center_id=12),
-                    Admin(username='samsung1@admin.com', password=generate_password_hash('admin123'), service_center_id=13),
-                    Admin(username='samsung2@admin.com', password=generate_password_hash('admin123'), service_center_id=14),
-                    Admin(username='samsung3@admin.com', password=generate_password_hash('admin123'), service_center_id=15),
-                    Admin(username='samsung4@admin.com', password=generate_password_hash('admin123'), service_center_id=16),
-                    Admin(username='vivo@admin.com', password=generate_password_hash('admin123'), service_center_id=17),
-                    Admin(username='vivoiqoo@admin.com', password=generate_password_hash('admin123'), service_center_id=18),
-                    Admin(username='oppo@admin.com', password=generate_password_hash('admin123'), service_center_id=19),
+                    Admin(username='apollo@admin.com', password=hash_password('admin123'), service_center_id=1),
+                    Admin(username='nagpurclinic@admin.com', password=hash_password('admin123'), service_center_id=2),
+                    Admin(username='localclinic@admin.com', password=hash_password('admin123'), service_center_id=3),
+                    Admin(username='motherindia@admin.com', password=hash_password('admin123'), service_center_id=4),
+                    Admin(username='ashvatam@admin.com', password=hash_password('admin123'), service_center_id=5),
+                    Admin(username='apna@admin.com', password=hash_password('admin123'), service_center_id=6),
+                    Admin(username='agrawal@admin.com', password=hash_password('admin123'), service_center_id=7),
+                    Admin(username='shree@admin.com', password=hash_password('admin123'), service_center_id=8),
+                    Admin(username='sai@admin.com', password=hash_password('admin123'), service_center_id=9),
+                    Admin(username='suyash@admin.com', password=hash_password('admin123'), service_center_id=10),
+                    Admin(username='inc@admin.com', password=hash_password('admin123'), service_center_id=11),
+                    Admin(username='apple@admin.com', password=hash_password('admin123'), service_center_id=12),
+                    Admin(username='samsung1@admin.com', password=hash_password('admin123'), service_center_id=13),
+                    Admin(username='samsung2@admin.com', password=hash_password('admin123'), service_center_id=14),
+                    Admin(username='samsung3@admin.com', password=hash_password('admin123'), service_center_id=15),
+                    Admin(username='samsung4@admin.com', password=hash_password('admin123'), service_center_id=16),
+                    Admin(username='vivo@admin.com', password=hash_password('admin123'), service_center_id=17),
+                    Admin(username='vivoiqoo@admin.com', password=hash_password('admin123'), service_center_id=18),
+                    Admin(username='oppo@admin.com', password=hash_password('admin123'), service_center_id=19),
                 ]
                 db.session.add_all(admins)
                 db.session.commit()
@@ -261,11 +261,11 @@ def init_db(app):
         try:
             if User.query.count() == 0:
                 demo_users = [
-                    User(name='Rahul Sharma', mobile='9876543210', email='rahul@demo.com', password=generate_password_hash('demo123')),
-                    User(name='Priya Patel', mobile='9876543211', email='priya@demo.com', password=generate_password_hash('demo123')),
-                    User(name='Amit Kumar', mobile='9876543212', email='amit@demo.com', password=generate_password_hash('demo123')),
-                    User(name='Sneha Deshmukh', mobile='9876543213', email='sneha@demo.com', password=generate_password_hash('demo123')),
-                    User(name='Vikram Singh', mobile='9876543214', email='vikram@demo.com', password=generate_password_hash('demo123')),
+                    User(name='Rahul Sharma', mobile='9876543210', email='rahul@demo.com', password=hash_password('demo123')),
+                    User(name='Priya Patel', mobile='9876543211', email='priya@demo.com', password=hash_password('demo123')),
+                    User(name='Amit Kumar', mobile='9876543212', email='amit@demo.com', password=hash_password('demo123')),
+                    User(name='Sneha Deshmukh', mobile='9876543213', email='sneha@demo.com', password=hash_password('demo123')),
+                    User(name='Vikram Singh', mobile='9876543214', email='vikram@demo.com', password=hash_password('demo123')),
                 ]
                 db.session.add_all(demo_users)
                 db.session.commit()
@@ -278,7 +278,7 @@ def init_db(app):
             if SuperAdmin.query.count() == 0:
                 super_admin = SuperAdmin(
                     username='superadmin@queueflow.com',
-                    password=generate_password_hash('superadmin123'),
+                    password=hash_password('superadmin123'),
                     email='superadmin@queueflow.com'
                 )
                 db.session.add(super_admin)
@@ -0,0 +1,30 @@
+"""Connection pragmas that let several workers share one SQLite file
+
+Applied to every new DBAPI connection of each SQLite engine (create_app
+hooks the engines up). SQLITE_PRAGMAS in config.py is the profile:
+
+  journal_mode=WAL   readers no longer block the writer or each other
+  synchronous=NORMAL fsync at checkpoints instead of every commit; with WAL a
+                     power loss can drop the last commits but never corrupts
+  busy_timeout       wait this many ms for the write lock instead of raising
+                     "database is locked"
+  mmap_size          serve reads from the OS page cache without copying
+
+See benchmarks/bench_sqlite_concurrency.py for the effect.
+"""
+from sqlalchemy import event
+
+
+def apply_sqlite_profile(engine, pragmas):
+    """Run PRAGMA name=value for each of pragmas on every new connection of engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
@@ -1,11 +1,14 @@
 import os
-import requests
+import uuid
 import pytz
-from dotenv import load_dotenv
-load_dotenv()
 from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from extensions import db
 from models import Token, ServiceCenter, User
+from cache import get_cache
+from center_cache import get_center
+from queue_version import bump_queue_version
 
 IST = pytz.timezone('Asia/Kolkata')
 
@@ -61,18 +64,55 @@ def utc_to_ist(utc_time):
         return utc_time.astimezone(IST)
 
 
+def live_token_criteria():
+    """Extra filters for queries over live (pending/active/serving) tokens
+
+    With TOKEN_PARTITIONING on, tokens is range-partitioned by created_time
+    month on PostgreSQL, and bounding created_time lets the planner prune
+    every partition but the newest. Live tokens older than the bound are
+    expired by expire_old_tokens(). Empty when partitioning is off.
+    """
+    hours = current_app.config.get('LIVE_TOKEN_MAX_AGE_HOURS')
+    if not current_app.config.get('TOKEN_PARTITIONING') or not hours:
+        return []
+    return [Token.created_time >= get_ist_now() - timedelta(hours=hours)]
+
+
+def todays_token_criteria(center_id):
+    """Tokens created today at a center, as a created_time range (index- and partition-friendly)"""
+    start = datetime.combine(get_ist_now().date(), datetime.min.time())
+    return [Token.service_center_id == center_id,
+            Token.created_time >= start,
+            Token.created_time < start + timedelta(days=1)]
+
+
 def get_active_token_for_user(user_id):
     try:
         return Token.query.filter_by(user_id=user_id).filter(
-            Token.status.in_(['PendingPayment', 'Active', 'Serving'])
+            Token.status.in_(['PendingPayment', 'Active', 'Serving']),
+            *live_token_criteria()
         ).first()
     except:
         return None
 
 
+def is_active_token_conflict(error):
+    """True if an IntegrityError came from the one-active-token-per-user index"""
+    message = str(getattr(error, 'orig', error)).strip()
+    # PostgreSQL names the index; SQLite lists the indexed columns
+    return 'ux_tokens_user_active' in message or message.endswith('constraint failed: tokens.user_id')
+
+
+def idempotency_key(value=None):
+    """A client-supplied idempotency key (trimmed to the column size), or a fresh one"""
+    value = (value or '').strip()[:64]
+    return value or uuid.uuid4().hex
+
+
 def get_queue_count(center_id):
     try:
-        return Token.query.filter_by(service_center_id=center_id, status='Active', is_walkin=False).count()
+        return Token.query.filter_by(service_center_id=center_id, status='Active', is_walkin=False).filter(
+            *live_token_criteria()).count()
     except:
         # Fallback if is_walkin column doesn't exist
         return Token.query.filter_by(service_center_id=center_id, status='Active').count()
@@ -80,38 +120,160 @@ def get_queue_count(center_id):
 
 def get_serving_token(center_id):
     try:
-        return Token.query.filter_by(service_center_id=center_id, status='Serving', is_walkin=False).first()
+        return Token.query.filter_by(service_center_id=center_id, status='Serving', is_walkin=False).filter(
+            *live_token_criteria()).first()
     except:
         # Fallback if is_walkin column doesn't exist
         return Token.query.filter_by(service_center_id=center_id, status='Serving').first()
 
 
+def get_center_listing(category=None, ttl_seconds=5):
+    """Service center cards with their online queue counts, from one grouped query
+
+    Only the columns the listing card renders are loaded. Results are cached
+    per category filter for ttl_seconds, so queue counts may lag by that much;
+    request_token re-checks the limit before issuing a token.
+    """
+    cache = get_cache()
+    cached = cache.ns_get('center_listing', category or '')
+    if cached is not None:
+        return cached
+
+    queue_counts = db.session.query(
+        Token.service_center_id,
+        db.func.sum(db.case((Token.status == 'Active', 1), else_=0)).label('queue_count'),
+        db.func.sum(db.case((Token.status == 'Serving', 1), else_=0)).label('serving_count')
+    ).filter(
+        Token.status.in_(['Active', 'Serving']),
+        Token.is_walkin == False,
+        *live_token_criteria()
+    ).group_by(Token.service_center_id).subquery()
+
+    query = db.session.query(
+        ServiceCenter.id, ServiceCenter.name, ServiceCenter.category,
+        ServiceCenter.location, ServiceCenter.avg_service_time,
+        db.func.coalesce(queue_counts.c.queue_count, 0).label('queue_count'),
+        db.func.coalesce(queue_counts.c.serving_count, 0).label('serving_count')
+    ).outerjoin(queue_counts, queue_counts.c.service_center_id == ServiceCenter.id)
+    if category:
+        query = query.filter(ServiceCenter.category.contains(category))
+
+    rows = query.order_by(ServiceCenter.id).all()
+    cache.ns_set('center_listing', category or '', rows, ttl_seconds)
+    return rows
+
+
 def get_walkin_queue_count(center_id):
     try:
-        return Token.query.filter_by(service_center_id=center_id, status='Active', is_walkin=True).count()
+        return Token.query.filter_by(service_center_id=center_id, status='Active', is_walkin=True).filter(
+            *live_token_criteria()).count()
     except:
         return 0
 
 
 def get_walkin_serving_token(center_id):
     try:
-        return Token.query.filter_by(service_center_id=center_id, status='Serving', is_walkin=True).first()
+        return Token.query.filter_by(service_center_id=center_id, status='Serving', is_walkin=True).filter(
+            *live_token_criteria()).first()
     except:
         return None
 
 
+def keyset_page(query, time_col, id_col, cursor=None, per_page=50):
+    """Return (rows, next_cursor) for a newest-first page of query
+
+    Pages are addressed by the (time, id) of the last row seen rather than an
+    OFFSET, so every page is a single index range scan. The cursor is an
+    opaque string like '20250101093000000000-42'; a malformed cursor is
+    treated as the first page. Rows whose time_col is NULL can't be placed in
+    the order and are left out.
+    """
+    query = query.filter(time_col.isnot(None))
+    if cursor:
+        try:
+            ts, row_id = cursor.rsplit('-', 1)
+            query = query.filter(db.tuple_(time_col, id_col) < (datetime.strptime(ts, '%Y%m%d%H%M%S%f'), int(row_id)))
+        except ValueError:
+            pass
+
+    rows = query.order_by(time_col.desc(), id_col.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = f"{getattr(last, time_col.key).strftime('%Y%m%d%H%M%S%f')}-{getattr(last, id_col.key)}"
+    return rows, next_cursor
+
+
 def generate_token_number(center_id):
-    today = get_ist_now().date()
-    count = Token.query.filter(
-        Token.service_center_id == center_id,
-        db.func.date(Token.created_time) == today
-    ).count()
+    count = Token.query.filter(*todays_token_criteria(center_id)).count()
     return f"T{count + 1:03d}"
 
 
+WALKIN_GUEST_MOBILE = 'WALKIN'
+WALKIN_GUEST_EMAIL = 'walkin@queueflow.invalid'  # .invalid never resolves, so no reset mail can arrive
+
+
+def get_walkin_guest_user_id():
+    """Id of the shared guest user that anonymous walk-in tokens belong to
+
+    Its password '!' can never match a hash, and login and password reset
+    skip it, so the account cannot be logged into. Created on first use; the
+    id is remembered per app.
+    """
+    app = current_app._get_current_object()
+    guest_id = app.extensions.get('queueflow_walkin_guest_id')
+    if guest_id is None:
+        guest_id = db.session.query(User.id).filter_by(mobile=WALKIN_GUEST_MOBILE).scalar()
+        if guest_id is None:
+            try:
+                with db.session.begin_nested():
+                    guest = User(name='Walk-in Customer', mobile=WALKIN_GUEST_MOBILE,
+                                 email=WALKIN_GUEST_EMAIL, password='!')
+                    db.session.add(guest)
+                guest_id = guest.id
+            except IntegrityError:
+                # Another worker created it first
+                guest_id = db.session.query(User.id).filter_by(mobile=WALKIN_GUEST_MOBILE).scalar()
+        app.extensions['queueflow_walkin_guest_id'] = guest_id
+    return guest_id
+
+
+def create_walkin_token(center_id, name, mobile=''):
+    """Issue and commit a walk-in token: one INSERT, no account, no password hashing
+
+    A 10-digit mobile that belongs to a registered user links the token to
+    that user, so no-shows still count against them; anyone else gets the
+    shared guest user. The name and mobile given at the desk are stored on
+    the token itself.
+    """
+    user_id = None
+    if mobile and len(mobile) == 10:
+        user_id = db.session.query(User.id).filter_by(mobile=mobile).scalar()
+    if user_id is None:
+        user_id = get_walkin_guest_user_id()
+
+    # Walk-in numbers share the center's daily sequence, with a W prefix
+    count = Token.query.filter(*todays_token_criteria(center_id)).count()
+
+    token = Token(
+        user_id=user_id,
+        service_center_id=center_id,
+        token_number=f"W{count + 1:03d}",
+        status='Active',
+        created_time=get_ist_now(),
+        is_walkin=True,
+        walkin_name=name or 'Walk-in Customer',
+        walkin_mobile=mobile or None
+    )
+    db.session.add(token)
+    db.session.commit()
+    return token
+
+
 def calculate_wait_time(center_id, token_position):
     """Calculate wait time until service starts (in minutes)"""
-    center = ServiceCenter.query.get(center_id)
+    center = get_center(center_id)
     # If first in queue, service starts immediately
     if token_position <= 1:
         return 0
@@ -121,6 +283,64 @@ def calculate_wait_time(center_id, token_position):
     return min(wait_minutes, 180)
 
 
+def estimate_queue_wait(queue_count, serving, avg_service_time):
+    """Wait before a new booking is served, with calculate_wait_time semantics"""
+    position = queue_count + 1 + (1 if serving else 0)
+    if position <= 1:
+        return 0
+    return min((position - 1) * (avg_service_time or 15), 180)
+
+
+def estimate_travel_time(distance_km, traffic_multiplier=None):
+    """Rough driving time in minutes from straight-line distance, without calling ORS
+
+    Assumes a 1.3 road/straight-line ratio at 25 km/h city speed, then applies
+    the same time-of-day traffic multiplier as calculate_travel_time(). Pass
+    traffic_multiplier when estimating many distances so the clock is read once.
+    """
+    if traffic_multiplier is None:
+        traffic_multiplier = get_traffic_multiplier()
+    return round(distance_km * 1.3 / 25 * 60 * traffic_multiplier)
+
+
+def get_queue_tail_token(center_id, before_token_id):
+    """Last online token (Active or Serving) booked before the given token, or None"""
+    return Token.query.filter(
+        Token.service_center_id == center_id,
+        Token.status.in_(['Active', 'Serving']),
+        Token.is_walkin == False,
+        Token.id < before_token_id,
+        *live_token_criteria()
+    ).order_by(Token.id.desc()).first()
+
+
+def calculate_booking_times(center, token, travel_time):
+    """Calculate (leave_time, reach_time) in UTC for a token being confirmed
+
+    The counter-free time is read from the stored end time of the token just
+    ahead in the queue, so the cost does not grow with queue length and no
+    travel-time calls are made for other users.
+    """
+    now = get_ist_now()
+    tail = get_queue_tail_token(center.id, token.id)
+
+    if tail is None:
+        # First person: Ready time (10 min) + Travel time
+        leave_time = now + timedelta(minutes=10)
+        return leave_time, leave_time + timedelta(minutes=travel_time)
+
+    # Serving token frees the counter at its actual end; waiting tokens at their estimate
+    if tail.status == 'Serving' and tail.actual_service_end:
+        counter_free = tail.actual_service_end
+    else:
+        counter_free = tail.estimated_service_end or now
+
+    # Reach time = max(counter free time, earliest arrival time)
+    earliest_arrival = now + timedelta(minutes=10 + travel_time)
+    reach_time = max(counter_free, earliest_arrival)
+    return reach_time - timedelta(minutes=travel_time), reach_time
+
+
 def get_traffic_multiplier():
     """Get traffic multiplier based on current time (IST)"""
     current_time = get_ist_now_aware()
@@ -148,6 +368,9 @@ def calculate_travel_time(user_lat, user_lon, center_lat, center_lon):
         print("❌ ORS API key not configured")
         return None
 
+    # Imported here: requests adds ~75 ms to every cold start and only provider calls need it
+    import requests
+
     try:
         url = 'https://api.openrouteservice.org/v2/directions/driving-car'
         headers = {'Authorization': ors_api_key}
@@ -197,7 +420,8 @@ def expire_old_tokens():
     expiry_time = current_time_utc - timedelta(hours=2)
     expired_tokens = Token.query.filter(
         Token.status == 'PendingPayment',
-        Token.created_time < expiry_time
+        Token.created_time < expiry_time,
+        *live_token_criteria()
     ).all()
     for token in expired_tokens:
         token.status = 'Expired'
@@ -205,7 +429,7 @@ def expire_old_tokens():
         token.no_show_time = current_time_utc
 
     # Auto-expire late users (15 min grace period after expected arrival)
-    active_tokens = Token.query.filter(Token.status == 'Active').all()
+    active_tokens = Token.query.filter(Token.status == 'Active', *live_token_criteria()).all()
     for token in active_tokens:
         if token.reach_time:
             # Convert UTC reach_time to IST for comparison
@@ -218,15 +442,43 @@ def expire_old_tokens():
                 token.no_show_time = current_time_utc
                 print(f"⏰ Auto-expired token {token.token_number} - Expected: {reach_time_ist.strftime('%I:%M %p')}, Current: {current_time_aware.strftime('%I:%M %p')}")
 
-    if expired_tokens or any(t.status == 'Expired' for t in active_tokens):
+    # Only the window just behind the live one: the partition maintenance job sweeps the rest
+    stale_tokens = expire_stale_live_tokens(recent_only=True)
+
+    if expired_tokens or stale_tokens or any(t.status == 'Expired' for t in active_tokens):
         db.session.commit()
-        print(f"✅ Expired {len(expired_tokens)} pending + {sum(1 for t in active_tokens if t.status == 'Expired')} late tokens")
+        print(f"✅ Expired {len(expired_tokens)} pending + {sum(1 for t in active_tokens if t.status == 'Expired')} late"
+              f" + {len(stale_tokens)} stale tokens")
+
+
+def expire_stale_live_tokens(recent_only=False):
+    """Expire live tokens older than the live-queue window; returns them
+
+    live_token_criteria() hides such tokens (e.g. walk-ins never called) from
+    the queue, so they are closed out rather than left live forever. With
+    recent_only, only tokens up to one window beyond it are looked at, which
+    keeps the query on the newest partitions. The caller commits.
+    """
+    hours = current_app.config.get('LIVE_TOKEN_MAX_AGE_HOURS')
+    if not current_app.config.get('TOKEN_PARTITIONING') or not hours:
+        return []
+    current_time = get_ist_now()
+    horizon = current_time - timedelta(hours=hours)
+    criteria = [Token.status.in_(['PendingPayment', 'Active', 'Serving']), Token.created_time < horizon]
+    if recent_only:
+        criteria.append(Token.created_time >= horizon - timedelta(hours=hours))
+    stale_tokens = Token.query.filter(*criteria).all()
+    for token in stale_tokens:
+        token.status = 'Expired'
+        token.no_show_reason = 'Auto-expired: still in queue past the live-queue window'
+        token.no_show_time = current_time
+    return stale_tokens
 
 
 def recalculate_queue_times(center_id):
     """Recalculate estimated times for all active tokens after cancellation/skip"""
     try:
-        center = ServiceCenter.query.get(center_id)
+        center = get_center(center_id)
         if not center:
             print(f"❌ Center {center_id} not found")
             return
@@ -238,7 +490,7 @@ def recalculate_queue_times(center_id):
             service_center_id=center_id,
             status='Active',
             is_walkin=False
-        ).order_by(Token.id).all()
+        ).filter(*live_token_criteria()).order_by(Token.id).all()
 
         if not active_tokens:
             return
@@ -294,6 +546,77 @@ def recalculate_queue_times(center_id):
         db.session.rollback()
 
 
+def recalculate_queue_suffix(center_id, removed_token_id):
+    """Shift estimated times for the tokens behind a removed token
+
+    Tokens ahead of the removed one cannot change, so only the suffix is
+    walked. Each token keeps its stored travel time (reach - leave), and the
+    walk stops as soon as a token's end time matches what is already stored,
+    because max(counter_free, earliest_arrival) makes everything after it
+    identical too. Changed rows are written back in one bulk UPDATE.
+    """
+    try:
+        center = get_center(center_id)
+        if not center:
+            print(f"❌ Center {center_id} not found")
+            return 0
+
+        current_time = get_ist_now()
+        service = timedelta(minutes=center.avg_service_time)
+
+        # Counter-free time right before the gap
+        predecessor = get_queue_tail_token(center_id, removed_token_id)
+        if predecessor is None:
+            serving_token = get_serving_token(center_id)
+            service_end_time = (serving_token.actual_service_end if serving_token else None) or current_time
+        elif predecessor.status == 'Serving' and predecessor.actual_service_end:
+            service_end_time = predecessor.actual_service_end
+        else:
+            service_end_time = predecessor.estimated_service_end or current_time
+
+        suffix = Token.query.filter(
+            Token.service_center_id == center_id,
+            Token.status == 'Active',
+            Token.is_walkin == False,
+            Token.id > removed_token_id,
+            *live_token_criteria()
+        ).order_by(Token.id).all()
+
+        updates = []
+        for token in suffix:
+            if token.leave_time and token.reach_time:
+                travel = token.reach_time - token.leave_time
+            else:
+                travel = timedelta(minutes=30)
+
+            earliest_arrival = token.created_time + timedelta(minutes=10) + travel
+            reach_time = max(service_end_time, earliest_arrival)
+            end_time = reach_time + service
+
+            if reach_time == token.reach_time and end_time == token.estimated_service_end:
+                break  # Converged with the existing schedule
+
+            updates.append({
+                'id': token.id,
+                'leave_time': reach_time - travel,
+                'reach_time': reach_time,
+                'estimated_service_start': reach_time,
+                'estimated_service_end': end_time,
+            })
+            service_end_time = end_time
+
+        if updates:
+            db.session.execute(db.update(Token), updates)
+            bump_queue_version([center_id])
+            db.session.commit()
+        print(f"✅ Shifted {len(updates)} of {len(suffix)} tokens behind token {removed_token_id} for center {center_id}")
+        return len(updates)
+    except Exception as e:
+        print(f"❌ Error in recalculate_queue_suffix: {e}")
+        db.session.rollback()
+        return 0
+
+
 def send_reset_email(email, reset_link, user_type="User"):
     """Send password reset email using Brevo API (free 300 emails/day)"""
     print(f"🔐 Attempting to send email to {email}")
@@ -303,6 +626,8 @@ def send_reset_email(email, reset_link, user_type="User"):
     brevo_sender_email = os.getenv('BREVO_SENDER_EMAIL', 'queueflowqms@gmail.com')
 
     if brevo_api_key:
+        import requests
+
         try:
             response = requests.post(
                 "https://api.brevo.com/v3/smtp/email",
@@ -360,6 +685,8 @@ def send_timing_alert(email, user_name, token_number, center_name, leave_time, r
         print("⚠️ Brevo API key not configured")
         return False
 
+    import requests
+
     # Convert to IST using centralized helper
     leave_time = utc_to_ist(leave_time)
     reach_time = utc_to_ist(reach_time)